@@ -3,46 +3,41 @@ Digia AI Assistant - Streamlit Web Application
 """
 
 import streamlit as st
-import sys
-import os
-from datetime import datetime
-
-# Add src directory to path
-current_dir = os.path.dirname(os.path.abspath(__file__))
-src_path = os.path.join(current_dir, 'src')
-if src_path not in sys.path:
-    sys.path.insert(0, src_path)
-
-# Import after adding to path
-try:
-    from config import (
-        COHERE_API_KEY,
-        VECTORDB_PATH,
-        COLLECTION_NAME,
-        COHERE_MODEL,
-        DATA_PATH,
-        CHUNK_SIZE,
-        CHUNK_OVERLAP
-    )
-    from vectorstore import VectorStoreManager
-    from rag_chain import RAGChain
-    from agent import DigiaAgent
-except ImportError as e:
-    st.error(f"Import Error: {e}")
-    st.info("Please check if all source files are present in the src/ directory")
-    st.stop()
+import threading
+import types
+import uuid
+from filelock import FileLock
 
+# Config and the cohere/chromadb/langchain stack are imported on first use,
+# so rendering the page does not pay for them up front
+_deps = types.SimpleNamespace(loaded=False)
 
-# Page configuration
-st.set_page_config(
-    page_title="Digia AI Assistant",
-    page_icon="🤖",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
 
-# Custom CSS
-st.markdown("""
+def _lazy_imports():
+    """Import config and the RAG/agent modules once, on first use"""
+    if not _deps.loaded:
+        try:
+            from src import config
+            from src.vectorstore import get_shared_manager
+            from src.rag_chain import RAGChain
+            from src.agent import DigiaAgent
+        except ImportError as e:
+            st.error(f"Import Error: {e}")
+            st.info("Please check if all source files are present in the src/ directory")
+            st.stop()
+        
+        _deps.config = config
+        _deps.get_shared_manager = get_shared_manager
+        _deps.RAGChain = RAGChain
+        _deps.DigiaAgent = DigiaAgent
+        _deps.loaded = True
+    
+    return _deps
+
+
+# Static page markup. Streamlit drops elements that a rerun does not emit,
+# so these are written on every run rather than once per session.
+_CUSTOM_CSS = """
     <style>
     .main-header {
         font-size: 2.5rem;
@@ -51,21 +46,6 @@ st.markdown("""
         text-align: center;
         margin-bottom: 1rem;
     }
-    .chat-message {
-        padding: 1rem;
-        border-radius: 0.5rem;
-        margin-bottom: 1rem;
-        display: flex;
-        flex-direction: column;
-    }
-    .user-message {
-        background-color: #e3f2fd;
-        border-left: 4px solid #2196f3;
-    }
-    .assistant-message {
-        background-color: #f5f5f5;
-        border-left: 4px solid #4caf50;
-    }
     .tool-info {
         font-size: 0.85rem;
         color: #666;
@@ -83,71 +63,141 @@ st.markdown("""
         width: 100%;
     }
     </style>
-""", unsafe_allow_html=True)
+"""
+
+_HEADER_HTML = '<div class="main-header">🤖 Digia AI Assistant</div>'
+
+_FOOTER_HTML = """
+    <div style="text-align: center; color: #666; font-size: 0.85rem;">
+        Powered by Cohere AI | Built with Streamlit | RAG + Agent Architecture
+    </div>
+"""
+
+
+# Page configuration
+st.set_page_config(
+    page_title="Digia AI Assistant",
+    page_icon="🤖",
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
+
+# Custom CSS
+st.markdown(_CUSTOM_CSS, unsafe_allow_html=True)
+
+
+@st.cache_resource(show_spinner=False)
+def _get_cohere_client():
+    """One Cohere client, and so one HTTP connection pool, for embed, rerank and chat"""
+    import cohere
+    import httpx
+    
+    return cohere.Client(
+        api_key=_lazy_imports().config.COHERE_API_KEY,
+        httpx_client=httpx.Client(
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+            timeout=300
+        )
+    )
+
+
+def _get_vs():
+    """Get the process-wide vector store manager (Chroma handle + Cohere embeddings)"""
+    deps = _lazy_imports()
+    return deps.get_shared_manager(
+        api_key=deps.config.COHERE_API_KEY,
+        persist_directory=deps.config.VECTORDB_PATH,
+        collection_name=deps.config.COLLECTION_NAME,
+        cohere_client=_get_cohere_client()
+    )
+
+
+def _vectordb_ready(vectorstore_manager):
+    """Probe the collection; a missing, empty or unreadable database is not ready"""
+    try:
+        if vectorstore_manager.vectorstore is None:
+            vectorstore_manager.load_vectorstore()
+        return vectorstore_manager.count() > 0
+    except Exception:
+        return False
+
+
+def _rebuild_vectordb(vectorstore_manager, config):
+    """Build the vector database; the file lock keeps concurrent workers from building twice"""
+    with FileLock(config.VECTORDB_PATH + ".lock"):
+        # Another worker may have finished the build while we waited for the lock
+        if _vectordb_ready(vectorstore_manager):
+            return
+        
+        st.warning("⚠️ Vector database not found. Building now...")
+        st.info("This is a one-time process and may take 2-3 minutes...")
+        
+        from src.data_loader import DocumentLoader
+        from src.embed_cache import EmbeddingCache
+        
+        # Build vector database
+        with st.spinner("Loading documents..."):
+            loader = DocumentLoader(config.DATA_PATH, config.CHUNK_SIZE, config.CHUNK_OVERLAP)
+            chunks = loader.process_documents()
+        
+        if not chunks:
+            st.error("❌ No documents found in data/company_docs/")
+            st.info("Please add company documents to the data folder")
+            st.stop()
+        
+        with st.spinner(f"Embedding {len(chunks)} chunks..."):
+            cache = EmbeddingCache(config.EMBED_CACHE_PATH)
+            try:
+                embeddings = loader.embed_chunks(chunks, vectorstore_manager.embeddings, cache=cache)
+            finally:
+                cache.close()
+        
+        with st.spinner(f"Creating vector database with {len(chunks)} chunks..."):
+            vectorstore_manager.create_vectorstore(chunks, embeddings=embeddings)
+        
+        st.success("✅ Vector database built successfully!")
 
 
 @st.cache_resource
 def initialize_agent():
     """Initialize and cache the agent system"""
+    deps = _lazy_imports()
+    config = deps.config
+    
     try:
         # Check API key
-        if not COHERE_API_KEY:
+        if not config.COHERE_API_KEY:
             st.error("❌ COHERE_API_KEY not found")
             st.info("Please configure COHERE_API_KEY in Streamlit Cloud secrets")
             st.stop()
         
-        # Check vector database - build if not exists
-        if not os.path.exists(VECTORDB_PATH):
-            st.warning("⚠️ Vector database not found. Building now...")
-            st.info("This is a one-time process and may take 2-3 minutes...")
-            
-            # Import build components
-            try:
-                from data_loader import DocumentLoader
-            except ImportError:
-                from src.data_loader import DocumentLoader
-            
-            # Build vector database
-            with st.spinner("Loading documents..."):
-                loader = DocumentLoader(DATA_PATH, CHUNK_SIZE, CHUNK_OVERLAP)
-                chunks = loader.process_documents()
-            
-            if not chunks:
-                st.error("❌ No documents found in data/company_docs/")
-                st.info("Please add company documents to the data folder")
-                st.stop()
-            
-            with st.spinner(f"Creating vector database with {len(chunks)} chunks..."):
-                temp_manager = VectorStoreManager(
-                    api_key=COHERE_API_KEY,
-                    persist_directory=VECTORDB_PATH,
-                    collection_name=COLLECTION_NAME
-                )
-                temp_manager.create_vectorstore(chunks)
-            
-            st.success("✅ Vector database built successfully!")
-            st.rerun()
+        # Check vector database - build if missing or empty
+        if not _vectordb_ready(_get_vs()):
+            _rebuild_vectordb(_get_vs(), config)
         
         # Initialize components
         with st.spinner("Loading knowledge base..."):
-            vectorstore_manager = VectorStoreManager(
-                api_key=COHERE_API_KEY,
-                persist_directory=VECTORDB_PATH,
-                collection_name=COLLECTION_NAME
-            )
+            vectorstore_manager = _get_vs()
         
         with st.spinner("Initializing RAG system..."):
-            rag_chain = RAGChain(
+            rag_chain = deps.RAGChain(
                 vectorstore_manager=vectorstore_manager,
-                cohere_api_key=COHERE_API_KEY,
-                model=COHERE_MODEL
+                cohere_api_key=config.COHERE_API_KEY,
+                model=config.COHERE_MODEL,
+                cohere_client=_get_cohere_client(),
+                cache_size=config.RAG_CACHE_SIZE,
+                cache_ttl=config.RAG_CACHE_TTL,
+                semantic_cache_tau=config.SEMANTIC_CACHE_TAU,
+                max_context_tokens=config.MAX_CONTEXT_TOKENS,
+                cohere_rerank_enabled=config.COHERE_RERANK_ENABLED
             )
         
         with st.spinner("Starting AI agent..."):
-            agent = DigiaAgent(
-                cohere_api_key=COHERE_API_KEY,
+            agent = deps.DigiaAgent(
+                cohere_api_key=config.COHERE_API_KEY,
                 rag_chain=rag_chain,
-                model=COHERE_MODEL
+                model=config.COHERE_MODEL,
+                cohere_client=_get_cohere_client()
             )
         
         return agent, rag_chain
@@ -157,18 +207,115 @@ def initialize_agent():
         st.stop()
 
 
-def display_message(role, content, tool_info=None, sources=None):
-    """Display a chat message with styling"""
-    css_class = "user-message" if role == "user" else "assistant-message"
-    icon = "👤" if role == "user" else "🤖"
+SAMPLE_QUESTIONS = (
+    "What is Digia?",
+    "What services do you provide?",
+    "Calculate 150 * 3",
+    "What's the current date?",
+    "How can I contact Digia?"
+)
+
+
+def _pick_sample_question():
+    """Queue the picked sample question and reset the picker so it can be picked again"""
+    if st.session_state.sample_pick:
+        st.session_state.pending_question = st.session_state.sample_pick
+        st.session_state.sample_pick = ""
+
+
+def _message_text(message):
+    """Get (role, text) from a chat history entry, dict or Cohere message object"""
+    if isinstance(message, dict):
+        return str(message.get("role", "")).upper(), message.get("message") or ""
+    return str(getattr(message, "role", "")).upper(), getattr(message, "message", None) or ""
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _summarize(messages: tuple) -> str:
+    """Cheap extractive summary of (role, text) pairs that fell out of the history window"""
+    return " | ".join(f"{role}: {text[:200]}" for role, text in messages if text)
+
+
+def _trim_chat_history(chat_history, max_messages):
+    """Keep the last max_messages entries, folding older ones into one summary message"""
+    if len(chat_history) <= max_messages:
+        return chat_history
+    
+    old, recent = chat_history[:-max_messages], chat_history[-max_messages:]
+    summary = _summarize(tuple(_message_text(message) for message in old))
+    
+    return [{"role": "SYSTEM", "message": f"Summary of earlier conversation: {summary}"}] + list(recent)
+
+
+@st.cache_resource(show_spinner=False)
+def _start_warmup(_vectorstore_manager):
+    """Warm the index and Cohere connection in the background, once per process"""
+    def warm():
+        try:
+            _vectorstore_manager.warm_up()
+        except Exception as e:
+            print(f"Warm-up skipped: {e}")
     
-    st.markdown(f"""
-        <div class="chat-message {css_class}">
-            <div><strong>{icon} {role.title()}</strong></div>
-            <div style="margin-top: 0.5rem;">{content}</div>
-        </div>
-    """, unsafe_allow_html=True)
+    thread = threading.Thread(target=warm, daemon=True)
+    thread.start()
+    return thread
+
+
+@st.cache_resource(show_spinner=False)
+def _get_chat_store():
+    """Process-wide chat log; its writer thread persists messages off the UI thread"""
+    from src.chat_store import ChatHistoryStore
+    
+    config = _lazy_imports().config
+    store = ChatHistoryStore(config.CHAT_HISTORY_PATH)
+    store.prune(config.CHAT_HISTORY_RETENTION_DAYS)
+    return store
+
+
+def _session_id() -> str:
+    """Id of this chat's log, kept in the URL (?chat=...) so a reload or rerun finds the same log"""
+    from src.chat_store import ChatHistoryStore
     
+    chat_id = st.query_params.get("chat")
+    if not chat_id or not ChatHistoryStore.is_valid_id(chat_id):
+        chat_id = uuid.uuid4().hex
+        st.query_params["chat"] = chat_id
+    return chat_id
+
+
+def _load_history() -> list:
+    """Most recent messages of this session, e.g. after a reconnect"""
+    return _get_chat_store().load(_session_id(), limit=_lazy_imports().config.MAX_SESSION_MESSAGES)
+
+
+def _append_message(message: dict):
+    """Add a message to the chat, persist it, and keep only the recent ones in memory"""
+    st.session_state.messages.append(message)
+    _get_chat_store().append(_session_id(), message)
+    
+    max_messages = _lazy_imports().config.MAX_SESSION_MESSAGES
+    if len(st.session_state.messages) > max_messages:
+        st.session_state.messages = st.session_state.messages[-max_messages:]
+
+
+def _stream_text(chunks, result: dict):
+    """Yield the text of a run_stream/query_stream generator; its final dict is collected into result"""
+    for chunk in chunks:
+        if isinstance(chunk, dict):
+            result.update(chunk)
+        else:
+            yield chunk
+
+
+def display_message(role, content, tool_info=None, sources=None):
+    """Display a chat message"""
+    with st.chat_message(role):
+        st.markdown(content)
+        display_details(tool_info, sources)
+
+
+def display_details(tool_info=None, sources=None):
+    """Display tool info and sources under a message"""
     # Display tool info if available
     if tool_info:
         st.markdown(f'<div class="tool-info">🔧 {tool_info}</div>', unsafe_allow_html=True)
@@ -176,28 +323,31 @@ def display_message(role, content, tool_info=None, sources=None):
     # Display sources if available
     if sources:
         with st.expander("📚 View Sources", expanded=False):
-            print(f"sources------: {sources}")
-            for i, source in enumerate(sources, 1):
-                print(f"source: {source}")
-                st.markdown(f"""
-                    <div class="source-box">
-                        <strong>{i}. {source.get('source', 'Unknown')}</strong><br>
-                        Relevance: {source.get('relevance_score', 0):.3f}<br>
-                        Preview: {source.get('content_preview', 'N/A')}
-                    </div>
-                """, unsafe_allow_html=True)
+            # One markdown element for all sources instead of one per source
+            sources_html = "".join(
+                f'<div class="source-box">'
+                f'<strong>{i}. {source.get("source", "Unknown")}</strong><br>'
+                f'Relevance: {source.get("relevance_score", 0):.3f}<br>'
+                f'Preview: {source.get("content_preview", "N/A")}'
+                f'</div>'
+                for i, source in enumerate(sources, 1)
+            )
+            st.markdown(sources_html, unsafe_allow_html=True)
 
 
 def main():
     """Main application"""
     
     # Header
-    st.markdown('<div class="main-header">🤖 Digia AI Assistant</div>', unsafe_allow_html=True)
+    st.markdown(_HEADER_HTML, unsafe_allow_html=True)
     st.markdown("---")
     
     # Initialize agent
     agent, rag_chain = initialize_agent()
     
+    # Overlap index/connection warm-up with the user typing the first question
+    _start_warmup(rag_chain.vectorstore_manager)
+    
     # Sidebar
     with st.sidebar:
         st.header("⚙️ Settings")
@@ -235,7 +385,9 @@ def main():
         st.subheader("📊 Session Stats")
         if "message_count" not in st.session_state:
             st.session_state.message_count = 0
-        st.metric("Messages Sent", st.session_state.message_count)
+        # Placeholder, so the metric can be refreshed after this run's message is counted
+        message_count_metric = st.empty()
+        message_count_metric.metric("Messages Sent", st.session_state.message_count)
         
         st.markdown("---")
         
@@ -244,27 +396,24 @@ def main():
             st.session_state.messages = []
             st.session_state.chat_history = []
             st.session_state.message_count = 0
+            _get_chat_store().clear(_session_id())
             st.rerun()
         
         st.markdown("---")
         
         # Sample questions
         st.subheader("💡 Try asking:")
-        sample_questions = [
-            "What is Digia?",
-            "What services do you provide?",
-            "Calculate 150 * 3",
-            "What's the current date?",
-            "How can I contact Digia?"
-        ]
-        
-        for question in sample_questions:
-            if st.button(question, key=f"sample_{question}"):
-                st.session_state.pending_question = question
+        st.selectbox(
+            "Sample questions",
+            ("", *SAMPLE_QUESTIONS),
+            key="sample_pick",
+            on_change=_pick_sample_question,
+            label_visibility="collapsed"
+        )
     
     # Initialize session state
     if "messages" not in st.session_state:
-        st.session_state.messages = []
+        st.session_state.messages = _load_history()
     
     if "chat_history" not in st.session_state:
         st.session_state.chat_history = []
@@ -297,74 +446,93 @@ def main():
     # Process user input
     if user_input:
         # Add user message to chat
-        st.session_state.messages.append({
+        _append_message({
             "role": "user",
             "content": user_input
         })
         st.session_state.message_count += 1
+        message_count_metric.metric("Messages Sent", st.session_state.message_count)
         
         # Display user message
         with chat_container:
             display_message("user", user_input)
         
         # Get response
-        with st.spinner("Thinking..."):
-            try:
-                if use_agent:
-                    # Use agent mode
-                    result = agent.run(user_input, chat_history=st.session_state.chat_history)
-                    
-                    response_text = result["answer"]
-                    tool_info = None
-                    sources = result.get("sources", [])  # Get sources from agent if available
-                    
-                    # Add tool information
-                    if result["tool_calls_made"]:
-                        tool_info = f"Used tools in {result['iterations']} iteration(s)"
-                    
-                    # Update chat history
-                    st.session_state.chat_history = result.get("chat_history", [])
+        try:
+            if use_agent:
+                # Use agent mode, rendering the answer as it streams in
+                result = {}
                 
-                else:
-                    # Use RAG only mode
-                    result = rag_chain.query(user_input, use_rerank=True)
-                    
-                    response_text = result["answer"]
-                    tool_info = "RAG retrieval with reranking"
-                    sources = result.get("sources", [])
+                with chat_container:
+                    assistant_message = st.chat_message("assistant")
+                    with assistant_message:
+                        streamed = st.write_stream(_stream_text(
+                            agent.run_stream(user_input, chat_history=st.session_state.chat_history),
+                            result
+                        ))
+                        
+                        # An error result carries its message only in the final dict
+                        if not streamed:
+                            st.markdown(result["answer"])
                 
-                # Add assistant message to chat
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": response_text,
-                    "tool_info": tool_info,
-                    "sources": sources
-                })
+                response_text = result["answer"]
+                tool_info = None
+                sources = result.get("sources", [])  # Get sources from agent if available
                 
-                # Display assistant message
-                with chat_container:
-                    display_message("assistant", response_text, tool_info, sources)
+                # Add tool information
+                if result["tool_calls_made"]:
+                    tool_info = f"Used tools in {result['iterations']} iteration(s)"
+                
+                # Update chat history, bounded so prompt size stays flat in long sessions
+                st.session_state.chat_history = _trim_chat_history(
+                    result.get("chat_history", []),
+                    _lazy_imports().config.MAX_HISTORY_MESSAGES
+                )
+                
+                with assistant_message:
+                    display_details(tool_info, sources)
             
-            except Exception as e:
-                error_message = f"I apologize, but I encountered an error: {str(e)}"
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": error_message
-                })
+            else:
+                # Use RAG only mode, rendering the answer as it streams in
+                result = {}
                 
                 with chat_container:
-                    display_message("assistant", error_message)
+                    assistant_message = st.chat_message("assistant")
+                    with assistant_message:
+                        streamed = st.write_stream(_stream_text(rag_chain.query_stream(user_input, use_rerank=True), result))
+                        
+                        # An error result carries its message only in the final dict
+                        if not streamed:
+                            st.markdown(result["answer"])
+                
+                response_text = result["answer"]
+                tool_info = "RAG retrieval with reranking"
+                sources = result.get("sources", [])
+                
+                with assistant_message:
+                    display_details(tool_info, sources)
+            
+            # Add assistant message to chat
+            _append_message({
+                "role": "assistant",
+                "content": response_text,
+                "tool_info": tool_info,
+                "sources": sources
+            })
         
-        # Rerun to update the display
-        st.rerun()
+        except Exception as e:
+            error_message = f"I apologize, but I encountered an error: {str(e)}"
+            _append_message({
+                "role": "assistant",
+                "content": error_message
+            })
+            
+            with chat_container:
+                display_message("assistant", error_message)
     
     # Footer
     st.markdown("---")
-    st.markdown("""
-        <div style="text-align: center; color: #666; font-size: 0.85rem;">
-            Powered by Cohere AI | Built with Streamlit | RAG + Agent Architecture
-        </div>
-    """, unsafe_allow_html=True)
+    st.markdown(_FOOTER_HTML, unsafe_allow_html=True)
 
 
 if __name__ == "__main__":
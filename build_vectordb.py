@@ -3,11 +3,12 @@ Main script for building vector database
 Run this script to create or update the vector database
 """
 
-import sys
 import os
+import asyncio
+from typing import List, Optional
 
-# Add src directory to path
-sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+import cohere
+from langchain_core.documents import Document
 
 from src.config import (
     COHERE_API_KEY, 
@@ -15,11 +16,64 @@ from src.config import (
     COLLECTION_NAME,
     DATA_PATH,
     CHUNK_SIZE,
-    CHUNK_OVERLAP
+    CHUNK_OVERLAP,
+    EMBED_CACHE_PATH
 )
 from src.data_loader import DocumentLoader
+from src.embed_cache import EmbeddingCache
 from src.vectorstore import VectorStoreManager
 
+# Number of chunks written to Chroma per collection.add call
+BATCH_SIZE = 5000
+
+
+async def build_embeddings_async(
+    chunks: List[Document],
+    model: str,
+    batch_size: int = 96,
+    concurrency: int = 8,
+    cache: Optional[EmbeddingCache] = None
+) -> List[List[float]]:
+    """Embed chunks in batches of up to 96 texts (Cohere's per-call limit), with bounded parallel requests"""
+    texts = [chunk.page_content for chunk in chunks]
+    
+    # Only chunks missing from the cache go to the API
+    vectors = cache.get_many(model, texts) if cache else [None] * len(texts)
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if cache:
+        print(f"{len(texts) - len(missing)}/{len(texts)} chunk embeddings found in cache")
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    missing_texts = [texts[i] for i in missing]
+    batches = [
+        missing_texts[i:i + batch_size]
+        for i in range(0, len(missing_texts), batch_size)
+    ]
+    print(f"Embedding {len(missing_texts)} chunks in {len(batches)} batch(es)...")
+    
+    # The client's connection pool is closed before the event loop ends
+    async with cohere.AsyncClient(COHERE_API_KEY) as client:
+        async def embed_batch(texts: List[str]) -> List[List[float]]:
+            async with semaphore:
+                response = await client.embed(
+                    texts=texts,
+                    model=model,
+                    input_type="search_document"
+                )
+                return response.embeddings
+        
+        # gather preserves batch order, so the flat list lines up with the missing chunks
+        results = await asyncio.gather(*(embed_batch(batch) for batch in batches))
+    embedded = [embedding for batch in results for embedding in batch]
+    
+    if cache and embedded:
+        cache.put_many(model, missing_texts, embedded)
+    
+    for i, embedding in zip(missing, embedded):
+        vectors[i] = embedding
+    return [list(map(float, vector)) for vector in vectors]
+
 
 def main():
     """Main function"""
@@ -65,13 +119,32 @@ def main():
         if os.path.exists(VECTORDB_PATH):
             response = input("\n⚠️  Vector database already exists. Overwrite? (y/n): ")
             if response.lower() == 'y':
+                # Open the persisted collection first, otherwise there is nothing to delete
+                # and the new vectors would be added on top of the old ones
+                manager.load_vectorstore()
                 manager.delete_collection()
                 print("Old database deleted")
             else:
                 print("Operation cancelled")
                 return
         
-        vectorstore = manager.create_vectorstore(chunks)
+        cache = EmbeddingCache(EMBED_CACHE_PATH)
+        try:
+            embeddings = asyncio.run(
+                build_embeddings_async(chunks, model=manager.embeddings.model, cache=cache)
+            )
+        finally:
+            cache.close()
+        manager.create_vectorstore(
+            chunks,
+            embeddings=embeddings,
+            batch_size=BATCH_SIZE
+        )
+        
+        stored = manager.count()
+        if stored != len(chunks):
+            print(f"❌ Vector database holds {stored} vectors, expected {len(chunks)}")
+            return
         
         # Step 3: Test database
         print("\n✅ Step 3/3: Test Vector Database")
@@ -85,9 +158,8 @@ def main():
         ]
         
         print("\nRunning test queries:")
-        for query in test_queries:
+        for query, results in zip(test_queries, manager.search_many(test_queries, k=2)):
             print(f"\nQuery: '{query}'")
-            results = manager.search(query, k=2)
             
             if results:
                 print(f"Found {len(results)} relevant results:")
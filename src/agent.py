@@ -2,9 +2,17 @@
 Agent system with tool calling and reasoning capabilities
 """
 
+import asyncio
 import cohere
-from typing import List, Dict, Any, Optional
-import json
+import hashlib
+import orjson
+import threading
+import traceback
+import weakref
+import types
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Iterator, Union, Callable, Tuple
 
 from src.tools import (
     KnowledgeBaseTool,
@@ -14,6 +22,28 @@ from src.tools import (
 )
 
 
+# Shared by every agent and every chat call; keeping the preamble and tool
+# definitions byte-identical (fixed order, no interpolation) across calls lets
+# any server-side prompt prefix caching match them
+TOOL_DEFINITIONS = tuple(sorted(get_tool_definitions(), key=lambda tool: tool["name"]))
+
+PREAMBLE = """You are an intelligent AI assistant for Digia company. Your role is to help customers by:
+
+        1. Answering questions about Digia's services, products, and company information
+        2. Performing calculations when needed
+        3. Providing current date/time information
+        4. Helping users find contact information
+
+        Guidelines:
+        - Be professional, friendly, and helpful
+        - Use tools when appropriate to provide accurate information
+        - If you need information from the knowledge base, use the knowledge_base_search tool
+        - For calculations, use the calculator tool
+        - For time-related queries, use the current_time tool
+        - Always provide clear and concise answers
+        - If you don't have information, be honest about it"""
+
+
 class DigiaAgent:
     """Intelligent agent for Digia customer service"""
     
@@ -23,9 +53,18 @@ class DigiaAgent:
         rag_chain,
         model: str = "command-a-03-2025",
         temperature: float = 0.3,
-        max_iterations: int = 5
+        max_iterations: int = 5,
+        cohere_client: Optional[cohere.Client] = None,
+        async_cohere_client: Optional[cohere.AsyncClient] = None,
+        answer_cache_size: int = 256
     ):
-        self.cohere_client = cohere.Client(cohere_api_key)
+        self.cohere_api_key = cohere_api_key
+        self.cohere_client = cohere_client or cohere.Client(cohere_api_key)
+        self._async_cohere_client = async_cohere_client
+        
+        # Async clients created here, one per event loop: an httpx async pool
+        # cannot be reused once the loop it was opened on has closed
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, cohere.AsyncClient]" = weakref.WeakKeyDictionary()
         self.model = model
         self.temperature = temperature
         self.max_iterations = max_iterations
@@ -37,56 +76,47 @@ class DigiaAgent:
             "current_time": CurrentTimeTool()
         }
         
-        # Get tool definitions for Cohere
-        self.tool_definitions = get_tool_definitions()
+        # Tool name -> (bound run method, name of the parameter passed to it),
+        # resolved once so a tool call is one dict lookup and one call
+        self._dispatch = {
+            "knowledge_base_search": (self.tools_map["knowledge_base_search"].run, "query"),
+            "calculator": (self.tools_map["calculator"].run, "expression"),
+            "current_time": (self.tools_map["current_time"].run, "query")
+        }
         
-        # System preamble
-        self.preamble = """You are an intelligent AI assistant for Digia company. Your role is to help customers by:
-
-        1. Answering questions about Digia's services, products, and company information
-        2. Performing calculations when needed
-        3. Providing current date/time information
-        4. Helping users find contact information
-
-        Guidelines:
-        - Be professional, friendly, and helpful
-        - Use tools when appropriate to provide accurate information
-        - If you need information from the knowledge base, use the knowledge_base_search tool
-        - For calculations, use the calculator tool
-        - For time-related queries, use the current_time tool
-        - Always provide clear and concise answers
-        - If you don't have information, be honest about it"""
+        # Tool calls of one step are I/O bound, so they run side by side
+        self._pool = ThreadPoolExecutor(max_workers=4)
+        
+        # Final answers keyed by message, history and all tool outputs, so a
+        # repeat of the same tool results skips the closing chat call
+        self._answer_cache: "OrderedDict[str, str]" = OrderedDict()
+        self._answer_cache_size = answer_cache_size
+        self._answer_cache_lock = threading.Lock()
+    
+    def get_async_client(self) -> cohere.AsyncClient:
+        """Async Cohere client for arun() in the running event loop, created on first use in each loop"""
+        if self._async_cohere_client is not None:
+            return self._async_cohere_client
+        
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = cohere.AsyncClient(self.cohere_api_key)
+        return client
     
     def execute_tool(self, tool_name: str, parameters: Dict[str, Any]) -> dict:
         """Execute a tool with given parameters"""
-        if tool_name not in self.tools_map:
-            return f"Error: Tool '{tool_name}' not found"
+        entry = self._dispatch.get(tool_name)
+        if entry is None:
+            return {
+                "context": f"Error: Tool '{tool_name}' not found",
+                "sources": None
+            }
         
-        tool = self.tools_map[tool_name]
+        run_tool, param_key = entry
         
         try:
-            # Extract parameters based on tool
-            if tool_name == "knowledge_base_search":
-                query = parameters.get("query", "")
-                return tool.run(query)
-            
-            elif tool_name == "calculator":
-                expression = parameters.get("expression", "")
-                return tool.run(expression)
-            
-            elif tool_name == "current_time":
-                query = parameters.get("query", "")
-                return tool.run(query)
-            
-            elif tool_name == "get_contact_info":
-                query = parameters.get("query", "")
-                return tool.run(query)
-            
-            else:
-                return {
-                    "context": f"Error: Unknown tool execution pattern for '{tool_name}'",
-                    "sources": None
-                }
+            return run_tool(parameters.get(param_key, ""))
         
         except Exception as e:
             return {
@@ -94,6 +124,135 @@ class DigiaAgent:
                 "sources": None
             }
     
+    def execute_knowledge_base_batch(self, parameters: List[Dict[str, Any]]) -> List[dict]:
+        """Run several knowledge base searches as one batch (one embedding call)"""
+        queries = [params.get("query", "") for params in parameters]
+        
+        try:
+            return self.tools_map["knowledge_base_search"].run_batch(queries)
+        
+        except Exception as e:
+            error = {
+                "context": f"Error executing tool 'knowledge_base_search': {str(e)}",
+                "sources": None
+            }
+            return [dict(error) for _ in queries]
+    
+    def _execute_single(self, tool_name: str, parameters: Dict[str, Any]) -> List[dict]:
+        return [self.execute_tool(tool_name, parameters)]
+    
+    def _tool_jobs(self, tool_calls: List) -> List[Tuple[List[int], Callable, tuple]]:
+        """Group a step's tool calls into jobs of (call indices, function, args), each function returning one output per index.
+        
+        Two or more knowledge base searches in one step share a single batched job.
+        """
+        searches = [i for i, tool_call in enumerate(tool_calls) if tool_call.name == "knowledge_base_search"]
+        if len(searches) < 2:
+            searches = []
+        
+        jobs = [
+            ([i], self._execute_single, (tool_call.name, tool_call.parameters))
+            for i, tool_call in enumerate(tool_calls)
+            if i not in searches
+        ]
+        if searches:
+            parameters = [tool_calls[i].parameters for i in searches]
+            jobs.append((searches, self.execute_knowledge_base_batch, (parameters,)))
+        return jobs
+    
+    @staticmethod
+    def _job_outputs(jobs: List, results: List[List[dict]], count: int) -> List[dict]:
+        """Put job results back in tool call order"""
+        outputs = [None] * count
+        for (indices, _, _), job_outputs in zip(jobs, results):
+            for i, output in zip(indices, job_outputs):
+                outputs[i] = output
+        return outputs
+    
+    def _answer_key(self, user_message: str, formatted_history: List[Dict], tool_outputs: List) -> str:
+        payload = orjson.dumps([user_message, formatted_history, sorted(tool_outputs)], default=str)
+        return hashlib.sha1(payload).hexdigest()
+    
+    def _cached_response(self, key: str, response):
+        """Stand-in for the final chat response when the answer for these tool outputs is cached"""
+        with self._answer_cache_lock:
+            answer = self._answer_cache.get(key)
+            if answer is None:
+                return None
+            self._answer_cache.move_to_end(key)
+        
+        print("✓ Final answer served from cache")
+        return types.SimpleNamespace(
+            text=answer,
+            tool_calls=None,
+            chat_history=list(response.chat_history or []) + [{"role": "CHATBOT", "message": answer}]
+        )
+    
+    def _remember_answer(self, key: Optional[str], response):
+        """Cache a final (tool-free) answer"""
+        if key is None or response.tool_calls:
+            return
+        
+        with self._answer_cache_lock:
+            self._answer_cache[key] = response.text
+            self._answer_cache.move_to_end(key)
+            while len(self._answer_cache) > self._answer_cache_size:
+                self._answer_cache.popitem(last=False)
+    
+    @staticmethod
+    def _tool_outputs(tool_results: List[Dict]) -> List:
+        return [[result["call"].name, result["outputs"][0]["output"]] for result in tool_results]
+    
+    def _log_tool_calls(self, tool_calls: List):
+        print(f"\n🔧 Agent wants to use {len(tool_calls)} tool(s)")
+        
+        for tool_call in tool_calls:
+            print(f"\n   Tool: {tool_call.name}")
+            print(f"   Parameters: {tool_call.parameters}")
+    
+    def execute_tool_calls(self, tool_calls: List, all_sources: List[Dict]) -> List[Dict]:
+        """Execute one iteration's tool calls, collecting knowledge base sources"""
+        self._log_tool_calls(tool_calls)
+        
+        # Execute the tool calls concurrently
+        jobs = self._tool_jobs(tool_calls)
+        futures = [self._pool.submit(run_job, *args) for _, run_job, args in jobs]
+        outputs = self._job_outputs(jobs, [future.result() for future in futures], len(tool_calls))
+        
+        return self._collect_tool_results(tool_calls, outputs, all_sources)
+    
+    async def aexecute_tool_calls(self, tool_calls: List, all_sources: List[Dict]) -> List[Dict]:
+        """Execute one iteration's tool calls concurrently from an event loop"""
+        self._log_tool_calls(tool_calls)
+        
+        # Tools are synchronous; run each job in a worker thread
+        jobs = self._tool_jobs(tool_calls)
+        results = await asyncio.gather(*(asyncio.to_thread(run_job, *args) for _, run_job, args in jobs))
+        outputs = self._job_outputs(jobs, results, len(tool_calls))
+        
+        return self._collect_tool_results(tool_calls, outputs, all_sources)
+    
+    def _collect_tool_results(self, tool_calls: List, outputs: List[Dict], all_sources: List[Dict]) -> List[Dict]:
+        """Pair outputs with their calls in call order, so tool_results and sources keep Cohere's ordering"""
+        tool_results = []
+        for tool_call, tool_result in zip(tool_calls, outputs):
+            result = tool_result.get("context", "")
+            sources = tool_result.get("sources", None)
+            
+            # Track sources from knowledge base
+            if sources:
+                print(f"agent sources: {sources}")
+                all_sources.extend(sources)
+            
+            tool_results.append({
+                "call": tool_call,
+                "outputs": [{"output": result}]
+            })
+            
+            print(f"   Result: {result[:100]}...")
+        
+        return tool_results
+    
     def format_chat_history(self, history: List) -> List[Dict]:
         """Format chat history for Cohere API"""
         formatted = []
@@ -158,8 +317,8 @@ class DigiaAgent:
                 "message": user_message,
                 "model": self.model,
                 "temperature": self.temperature,
-                "tools": self.tool_definitions,
-                "preamble": self.preamble
+                "tools": TOOL_DEFINITIONS,
+                "preamble": PREAMBLE
             }
             
             if formatted_history:
@@ -168,50 +327,33 @@ class DigiaAgent:
             response = self.cohere_client.chat(**api_kwargs)
             
             iteration = 1
+            tool_outputs = []
             
             # Handle tool calls in a loop
             while response.tool_calls and iteration < self.max_iterations:
-                print(f"\n🔧 Agent wants to use {len(response.tool_calls)} tool(s)")
-                
-                # Execute each tool call
-                tool_results = []
-                for tool_call in response.tool_calls:
-                    tool_name = tool_call.name
-                    parameters = tool_call.parameters
-                    
-                    print(f"\n   Tool: {tool_name}")
-                    print(f"   Parameters: {parameters}")
-                    
-                    # Execute tool
-                    tool_result = self.execute_tool(tool_name, parameters)
-                    result = tool_result.get("context", "")
-                    sources = tool_result.get("sources", None)
-                    
-                    # Track sources from knowledge base
-                    if sources:
-                        print(f"agent sources: {sources}")
-                        all_sources.extend(sources)
-                    
-                    tool_results.append({
-                        "call": tool_call,
-                        "outputs": [{"output": result}]
-                    })
-                    
-                    print(f"   Result: {result[:100]}...")
+                tool_results = self.execute_tool_calls(response.tool_calls, all_sources)
+                tool_outputs.extend(self._tool_outputs(tool_results))
                 
                 # Continue conversation with tool results
                 iteration += 1
                 print(f"\n🤖 Agent Iteration {iteration}/{self.max_iterations}")
                 
+                answer_key = self._answer_key(user_message, formatted_history, tool_outputs)
+                cached = self._cached_response(answer_key, response)
+                if cached is not None:
+                    response = cached
+                    break
+                
                 response = self.cohere_client.chat(
                     message="",
                     model=self.model,
                     temperature=self.temperature,
                     chat_history=response.chat_history,
-                    tools=self.tool_definitions,
+                    tools=TOOL_DEFINITIONS,
                     tool_results=tool_results,
-                    preamble=self.preamble
+                    preamble=PREAMBLE
                 )
+                self._remember_answer(answer_key, response)
             
             # Get final answer
             print(f"\n✅ Agent completed in {iteration} iteration(s)")
@@ -228,7 +370,6 @@ class DigiaAgent:
         
         except Exception as e:
             print(f"\n❌ Error in agent execution: {e}")
-            import traceback
             traceback.print_exc()
             
             return {
@@ -239,10 +380,75 @@ class DigiaAgent:
                 "sources": None,
                 "error": str(e)
             }
+    
+    async def arun(self, user_message: str, chat_history: Optional[List] = None) -> Dict[str, Any]:
+        """Run agent with tool calling on the async Cohere client, for callers running an event loop"""
+        print("\n" + "=" * 60)
+        print(f"Agent Processing: {user_message}")
+        print("=" * 60)
+        
+        formatted_history = []
+        if chat_history:
+            formatted_history = self.format_chat_history(chat_history)
+        
+        # Track sources from knowledge base queries
+        all_sources = []
+        client = self.get_async_client()
+        
+        try:
+            api_kwargs = {
+                "message": user_message,
+                "model": self.model,
+                "temperature": self.temperature,
+                "tools": TOOL_DEFINITIONS,
+                "preamble": PREAMBLE
+            }
+            
+            if formatted_history:
+                api_kwargs["chat_history"] = formatted_history
+            
+            response = await client.chat(**api_kwargs)
+            
+            iteration = 1
+            tool_outputs = []
+            
+            while response.tool_calls and iteration < self.max_iterations:
+                tool_results = await self.aexecute_tool_calls(response.tool_calls, all_sources)
+                tool_outputs.extend(self._tool_outputs(tool_results))
+                
+                iteration += 1
+                print(f"\n🤖 Agent Iteration {iteration}/{self.max_iterations}")
+                
+                answer_key = self._answer_key(user_message, formatted_history, tool_outputs)
+                cached = self._cached_response(answer_key, response)
+                if cached is not None:
+                    response = cached
+                    break
+                
+                response = await client.chat(
+                    message="",
+                    model=self.model,
+                    temperature=self.temperature,
+                    chat_history=response.chat_history,
+                    tools=TOOL_DEFINITIONS,
+                    tool_results=tool_results,
+                    preamble=PREAMBLE
+                )
+                self._remember_answer(answer_key, response)
+            
+            print(f"\n✅ Agent completed in {iteration} iteration(s)")
+            
+            return {
+                "answer": response.text,
+                "tool_calls_made": iteration > 1 or bool(response.tool_calls),
+                "iterations": iteration,
+                "chat_history": response.chat_history if hasattr(response, 'chat_history') else [],
+                "sources": all_sources if all_sources else None,
+                "error": None
+            }
         
         except Exception as e:
             print(f"\n❌ Error in agent execution: {e}")
-            import traceback
             traceback.print_exc()
             
             return {
@@ -254,6 +460,106 @@ class DigiaAgent:
                 "error": str(e)
             }
     
+    def run_stream(
+        self,
+        user_message: str,
+        chat_history: Optional[List] = None
+    ) -> Iterator[Union[str, Dict[str, Any]]]:
+        """Run agent with tool calling, streaming the answer.
+        
+        Yields text deltas as they are generated, then one final dict
+        with the same fields as run().
+        """
+        print("\n" + "=" * 60)
+        print(f"Agent Streaming: {user_message}")
+        print("=" * 60)
+        
+        formatted_history = []
+        if chat_history:
+            formatted_history = self.format_chat_history(chat_history)
+        
+        # Track sources from knowledge base queries
+        all_sources = []
+        
+        api_kwargs = {
+            "message": user_message,
+            "model": self.model,
+            "temperature": self.temperature,
+            "tools": TOOL_DEFINITIONS,
+            "preamble": PREAMBLE
+        }
+        
+        if formatted_history:
+            api_kwargs["chat_history"] = formatted_history
+        
+        try:
+            iteration = 1
+            tool_outputs = []
+            answer_key = None
+            
+            while True:
+                response = None
+                for event in self.cohere_client.chat_stream(**api_kwargs):
+                    if event.event_type == "text-generation":
+                        yield event.text
+                    elif event.event_type == "stream-end":
+                        response = event.response
+                
+                if response is None:
+                    raise RuntimeError("Stream ended without a final response")
+                
+                self._remember_answer(answer_key, response)
+                if not response.tool_calls or iteration >= self.max_iterations:
+                    break
+                
+                tool_results = self.execute_tool_calls(response.tool_calls, all_sources)
+                tool_outputs.extend(self._tool_outputs(tool_results))
+                
+                # Continue conversation with tool results
+                iteration += 1
+                print(f"\n🤖 Agent Iteration {iteration}/{self.max_iterations}")
+                
+                answer_key = self._answer_key(user_message, formatted_history, tool_outputs)
+                cached = self._cached_response(answer_key, response)
+                if cached is not None:
+                    response = cached
+                    yield response.text
+                    break
+                
+                api_kwargs = {
+                    "message": "",
+                    "model": self.model,
+                    "temperature": self.temperature,
+                    "chat_history": response.chat_history,
+                    "tools": TOOL_DEFINITIONS,
+                    "tool_results": tool_results,
+                    "preamble": PREAMBLE
+                }
+            
+            print(f"\n✅ Agent completed in {iteration} iteration(s)")
+            
+            yield {
+                "answer": response.text,
+                "tool_calls_made": iteration > 1 or bool(response.tool_calls),
+                "iterations": iteration,
+                "chat_history": response.chat_history if hasattr(response, 'chat_history') else [],
+                "sources": all_sources if all_sources else None,
+                "error": None
+            }
+        
+        except Exception as e:
+            print(f"\n❌ Error in agent execution: {e}")
+            traceback.print_exc()
+            
+            yield {
+                "answer": "I apologize, but I encountered an error processing your request. Please try again.",
+                "tool_calls_made": False,
+                "iterations": 0,
+                "chat_history": formatted_history,
+                "sources": None,
+                "error": str(e)
+            }
+    
     def run_simple(self, user_message: str) -> str:
         """Simple run method that returns only the answer"""
         result = self.run(user_message)
@@ -262,9 +568,9 @@ class DigiaAgent:
 
 if __name__ == "__main__":
     # Test agent
-    from config import COHERE_API_KEY, VECTORDB_PATH, COLLECTION_NAME, COHERE_MODEL
-    from vectorstore import VectorStoreManager
-    from rag_chain import RAGChain
+    from src.config import COHERE_API_KEY, VECTORDB_PATH, COLLECTION_NAME, COHERE_MODEL
+    from src.vectorstore import VectorStoreManager
+    from src.rag_chain import RAGChain
     
     print("Initializing Agent System...")
     
@@ -0,0 +1,140 @@
+"""
+Per-session chat message persistence in SQLite
+"""
+
+import os
+import orjson
+import queue
+import re
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Optional
+
+# Chat ids become file names, so only plain tokens are accepted
+_CHAT_ID_RE = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+class ChatHistoryStore:
+    """Append-only chat message log, one SQLite file per chat, written by a background thread"""
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        
+        # Writes are queued so the UI thread never waits on disk
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._drain, daemon=True)
+        self._writer.start()
+    
+    @staticmethod
+    def is_valid_id(session_id: str) -> bool:
+        """Whether a chat id is safe to use as a file name"""
+        return bool(session_id) and _CHAT_ID_RE.fullmatch(session_id) is not None
+    
+    def _db_path(self, session_id: str) -> str:
+        if not self.is_valid_id(session_id):
+            raise ValueError(f"Invalid chat id: {session_id!r}")
+        return os.path.join(self.directory, f"{session_id}.sqlite")
+    
+    def _connect(self, session_id: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._db_path(session_id), isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, role TEXT, content TEXT, extra TEXT, ts REAL)"
+        )
+        return conn
+    
+    def _drain(self):
+        """Writer thread: apply queued appends and clears in order"""
+        while True:
+            op, session_id, message, ts = self._queue.get()
+            try:
+                if op == "prune":
+                    self._prune(ts)
+                    continue
+                
+                conn = self._connect(session_id)
+                try:
+                    if op == "append":
+                        extra = {k: v for k, v in message.items() if k not in ("role", "content")}
+                        conn.execute(
+                            "INSERT INTO messages(role, content, extra, ts) VALUES(?, ?, ?, ?)",
+                            (message["role"], message["content"], orjson.dumps(extra).decode(), ts)
+                        )
+                    elif op == "clear":
+                        conn.execute("DELETE FROM messages")
+                finally:
+                    conn.close()
+            except Exception as e:
+                print(f"✗ Failed to persist chat history for session {session_id}: {e}")
+            finally:
+                self._queue.task_done()
+    
+    def _prune(self, cutoff: float):
+        """Delete the chat logs last written before cutoff (a timestamp)"""
+        with os.scandir(self.directory) as entries:
+            paths = [entry.path for entry in entries if entry.name.endswith(".sqlite")]
+        
+        for path in paths:
+            files = [path + suffix for suffix in ("", "-wal", "-shm")]
+            existing = [f for f in files if os.path.exists(f)]
+            if max(os.path.getmtime(f) for f in existing) < cutoff:
+                for f in existing:
+                    os.remove(f)
+                print(f"✓ Removed old chat history {os.path.basename(path)}")
+    
+    def append(self, session_id: str, message: Dict):
+        """Queue a message for writing"""
+        self._queue.put(("append", session_id, message, time.time()))
+    
+    def clear(self, session_id: str):
+        """Queue deletion of a session's messages"""
+        self._queue.put(("clear", session_id, None, None))
+    
+    def prune(self, max_age_days: float):
+        """Queue deletion of chat logs not written to in the last max_age_days days"""
+        self._queue.put(("prune", None, None, time.time() - max_age_days * 86400))
+    
+    def flush(self):
+        """Block until all queued writes are done"""
+        self._queue.join()
+    
+    def load(self, session_id: str, limit: Optional[int] = None) -> List[Dict]:
+        """Load a session's messages in order, only the last `limit` if given"""
+        if not os.path.exists(self._db_path(session_id)):
+            return []
+        
+        conn = self._connect(session_id)
+        try:
+            if limit is None:
+                rows = conn.execute("SELECT role, content, extra FROM messages ORDER BY id").fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT role, content, extra FROM messages ORDER BY id DESC LIMIT ?", (limit,)
+                ).fetchall()
+                rows.reverse()
+        finally:
+            conn.close()
+        
+        messages = []
+        for role, content, extra in rows:
+            message = {"role": role, "content": content}
+            message.update(orjson.loads(extra) if extra else {})
+            messages.append(message)
+        return messages
+
+
+if __name__ == "__main__":
+    # Test code
+    import tempfile
+    
+    store = ChatHistoryStore(tempfile.mkdtemp())
+    store.append("demo", {"role": "user", "content": "What is Digia?"})
+    store.append("demo", {"role": "assistant", "content": "Digia is ...", "tool_info": None, "sources": []})
+    store.flush()
+    
+    for message in store.load("demo"):
+        print(message)
@@ -10,6 +10,7 @@ COHERE_API_KEY = os.getenv("COHERE_API_KEY")
 # Vector Database Configuration
 VECTORDB_PATH = "./vectordb"
 COLLECTION_NAME = "digia_knowledge"
+EMBED_CACHE_PATH = "./embed_cache.sqlite"  # Chunk embeddings reused across rebuilds
 
 # Document Configuration
 DATA_PATH = "./data/company_docs"
@@ -21,8 +22,19 @@ CHUNK_OVERLAP = 50  # Overlapping characters between chunks
 # Retrieval Configuration
 TOP_K_RETRIEVAL = 20  # Initial retrieval count
 TOP_K_RERANK = 3  # Number of results after reranking
+COHERE_RERANK_ENABLED = True  # False: the knowledge base tool reranks locally by embedding similarity
+MAX_CONTEXT_TOKENS = 3000  # Budget for retrieved documents in the RAG prompt
+RAG_CACHE_SIZE = 256  # Answers kept in the exact-match cache
+RAG_CACHE_TTL = 3600  # Seconds before a cached answer expires
+SEMANTIC_CACHE_TAU = 0.85  # Cosine similarity above which a cached answer is reused
 
 # LLM Configuration
 COHERE_MODEL = "command-a-03-2025" #"command-r-plus-08-2024"
 TEMPERATURE = 0.3
-MAX_TOKENS = 1000
\ No newline at end of file
+MAX_TOKENS = 1000
+
+# Chat Configuration
+MAX_HISTORY_MESSAGES = 16  # Messages kept verbatim; older ones are summarized
+MAX_SESSION_MESSAGES = 32  # Messages kept in memory for display; the full log is on disk
+CHAT_HISTORY_PATH = "./chat_history"  # One SQLite file per chat; the chat id is kept in the page URL
+CHAT_HISTORY_RETENTION_DAYS = 30  # Chat logs untouched for longer are deleted
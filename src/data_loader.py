@@ -1,8 +1,97 @@
+import codecs
 import os
-from pathlib import Path
-from typing import List
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import re
+import hashlib
+import mmap
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from langchain_text_splitters import TextSplitter
 from langchain_core.documents import Document
+from src.embed_cache import EmbeddingCache
+
+# Files above this size are read through mmap instead of buffered reads
+MMAP_THRESHOLD = 64 * 1024
+
+
+class FastSplitter(TextSplitter):
+    """Character splitter that cuts each chunk with a few C-level scans of its window.
+    
+    Break points are ranked paragraph > line > sentence > word, like the
+    separators of the recursive splitter it replaces. Each chunk ends after the
+    highest-ranked break in the second half of its window.
+    """
+    
+    _ranked_separators = (("\n\n",), ("\n",), (".", "!", "?"), (" ", "\t"))
+    _all_separators = ("\n", ".", "!", "?", " ", "\t")
+    _boundary_re = re.compile(r"[\s.!?]")
+    
+    def _break_point(self, text: str, start: int, limit: int) -> int:
+        """Offset just after the best break in text[start:limit], or limit if there is none"""
+        half = start + self._chunk_size // 2
+        for separators in self._ranked_separators:
+            end = max(text.rfind(sep, half, limit) + len(sep) for sep in separators)
+            if end > half:
+                return end
+        
+        end = max(text.rfind(sep, start, limit) + len(sep) for sep in self._all_separators)
+        return end if end > start else limit
+    
+    def split_offsets(self, text: str) -> List[Tuple[int, int]]:
+        """(start, end) offsets of the whitespace-stripped chunks of text"""
+        offsets = []
+        start = 0
+        while start < len(text):
+            limit = start + self._chunk_size
+            end = len(text) if limit >= len(text) else self._break_point(text, start, limit)
+            
+            # Strip by moving the offsets rather than copying the substring
+            chunk_start, chunk_end = start, end
+            while chunk_start < chunk_end and text[chunk_start].isspace():
+                chunk_start += 1
+            while chunk_end > chunk_start and text[chunk_end - 1].isspace():
+                chunk_end -= 1
+            if chunk_start < chunk_end:
+                offsets.append((chunk_start, chunk_end))
+            if end >= len(text):
+                break
+            
+            # Back up by at most the overlap, to just after a boundary, always moving forward
+            match = self._boundary_re.search(text, max(end - self._chunk_overlap, start + 1), end)
+            start = match.end() if match else end
+        
+        return offsets
+    
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.split_offsets(text)]
+
+
+class ChunkView:
+    """A chunk that references its parent document's text by offsets.
+    
+    Stands in for a Document (page_content, metadata, id) without holding
+    its own copy of the text; page_content is sliced on access.
+    """
+    
+    __slots__ = ("doc", "start", "end", "metadata", "id")
+    
+    def __init__(self, doc: str, start: int, end: int, metadata: Dict[str, Any], id: Optional[str] = None):
+        self.doc = doc
+        self.start = start
+        self.end = end
+        self.metadata = metadata
+        self.id = id
+    
+    @property
+    def page_content(self) -> str:
+        return self.doc[self.start:self.end]
+    
+    def __len__(self) -> int:
+        return self.end - self.start
+    
+    def __repr__(self) -> str:
+        return f"ChunkView(page_content={self.page_content[:40]!r}..., metadata={self.metadata!r})"
+
 
 class DocumentLoader:
     """Load and process documents"""
@@ -11,55 +100,142 @@ class DocumentLoader:
         self.data_path = data_path
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self.text_splitter = RecursiveCharacterTextSplitter(
+        self.text_splitter = FastSplitter(
             chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", ".", "!", "?", " ", ""]
+            chunk_overlap=chunk_overlap
         )
     
+    def _walk(self, root: str) -> Iterator[os.DirEntry]:
+        """Recursively yield .txt file entries; scandir reuses the directory listing's file type info"""
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from self._walk(entry.path)
+                elif entry.name.endswith(".txt"):
+                    yield entry
+    
+    def _load_file(self, entry: os.DirEntry, data_dir: str) -> Optional[Document]:
+        """Read one text file into a Document, or None if it cannot be read"""
+        try:
+            if entry.stat().st_size > MMAP_THRESHOLD:
+                with open(entry.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    # Decode straight from the mapping, without copying it into a bytes object first;
+                    # the view is released before the mapping closes
+                    with memoryview(mm) as view:
+                        content = codecs.decode(view, 'utf-8')
+                    # Normalize newlines as text mode would
+                    content = content.replace('\r\n', '\n').replace('\r', '\n')
+            else:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+            
+            # Get relative path as metadata
+            relative_path = os.path.relpath(entry.path, data_dir)
+            parts = relative_path.split(os.sep)
+            
+            # Create Document object
+            return Document(
+                page_content=content,
+                metadata={
+                    "source": relative_path,
+                    "filename": entry.name,
+                    "category": parts[0] if len(parts) > 1 else "general"
+                }
+            )
+            
+        except Exception as e:
+            print(f"✗ Failed to load {entry.path}: {e}")
+            return None
+    
     def load_documents(self) -> List[Document]:
         """Load all documents from the data directory"""
-        documents = []
-        data_dir = Path(self.data_path)
+        data_dir = self.data_path
         
-        if not data_dir.exists():
+        if not os.path.isdir(data_dir):
             raise FileNotFoundError(f"Data directory not found: {self.data_path}")
         
-        # Recursively traverse all text files
-        for file_path in data_dir.rglob("*.txt"):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                # Get relative path as metadata
-                relative_path = file_path.relative_to(data_dir)
-                
-                # Create Document object
-                doc = Document(
-                    page_content=content,
-                    metadata={
-                        "source": str(relative_path),
-                        "filename": file_path.name,
-                        "category": relative_path.parts[0] if len(relative_path.parts) > 1 else "general"
-                    }
-                )
+        # Recursively collect all text files, then read them on a thread pool
+        # so disk reads overlap instead of running back to back
+        entries = list(self._walk(data_dir))
+        with ThreadPoolExecutor(max_workers=min(16, (os.cpu_count() or 1) * 2)) as pool:
+            loaded = list(pool.map(lambda entry: self._load_file(entry, data_dir), entries))
+        
+        documents = []
+        for doc in loaded:
+            if doc is not None:
                 documents.append(doc)
-                print(f"✓ Loaded: {relative_path}")
-                
-            except Exception as e:
-                print(f"✗ Failed to load {file_path}: {e}")
+                print(f"✓ Loaded: {doc.metadata['source']}")
         
         print(f"\nTotal documents loaded: {len(documents)}")
         return documents
     
-    def split_documents(self, documents: List[Document]) -> List[Document]:
-        """Split documents into chunks"""
-        chunks = self.text_splitter.split_documents(documents)
+    def split_documents(self, documents: List[Document]) -> List[ChunkView]:
+        """Split documents into chunks that reference the document text instead of copying it"""
+        chunks = [
+            ChunkView(doc.page_content, start, end, dict(doc.metadata))
+            for doc in documents
+            for start, end in self.text_splitter.split_offsets(doc.page_content)
+        ]
         print(f"Documents split into {len(chunks)} chunks")
-        return chunks
+        return self.deduplicate_chunks(chunks)
+    
+    def deduplicate_chunks(self, chunks: List[ChunkView]) -> List[ChunkView]:
+        """Keep one chunk per distinct text (e.g. repeated boilerplate), recording every source it came from"""
+        seen: Dict[str, ChunkView] = {}
+        for chunk in chunks:
+            digest = hashlib.blake2b(chunk.page_content.encode("utf-8"), digest_size=16).hexdigest()
+            first = seen.get(digest)
+            if first is None:
+                seen[digest] = chunk
+                continue
+            
+            # Chroma metadata values must be scalars, so sources are joined into one string
+            sources = first.metadata.get("sources", first.metadata["source"]).split(" | ")
+            if chunk.metadata["source"] not in sources:
+                sources.append(chunk.metadata["source"])
+                first.metadata["sources"] = " | ".join(sources)
+        
+        if len(seen) < len(chunks):
+            print(f"Removed {len(chunks) - len(seen)} duplicate chunks")
+        return list(seen.values())
+    
+    def embed_chunks(
+        self,
+        chunks: List[ChunkView],
+        embedder,
+        batch_size: int = 96,
+        cache: Optional[EmbeddingCache] = None
+    ) -> np.ndarray:
+        """Embed chunks with one Cohere embed call per batch (96 texts is the API maximum)"""
+        texts = [chunk.page_content for chunk in chunks]
+        
+        # Only chunks missing from the cache go to the API
+        vectors = cache.get_many(embedder.model, texts) if cache else [None] * len(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if cache:
+            print(f"✓ {len(texts) - len(missing)}/{len(texts)} chunk embeddings found in cache")
+        
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            batch_texts = [texts[i] for i in batch]
+            response = embedder.client.embed(
+                texts=batch_texts,
+                model=embedder.model,
+                input_type="search_document"
+            )
+            embedded = np.asarray(response.embeddings, dtype=np.float32)
+            for i, vector in zip(batch, embedded):
+                vectors[i] = vector
+            
+            if cache:
+                cache.put_many(embedder.model, batch_texts, embedded)
+            print(f"✓ Embedded {min(start + batch_size, len(missing))}/{len(missing)} chunks")
+        
+        if not vectors:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack(vectors)
     
-    def process_documents(self) -> List[Document]:
+    def process_documents(self) -> List[ChunkView]:
         """Complete document processing pipeline"""
         print("=" * 50)
         print("Starting document loading and processing...")
@@ -83,7 +259,7 @@ class DocumentLoader:
 
 if __name__ == "__main__":
     # Test code
-    from config import DATA_PATH, CHUNK_SIZE, CHUNK_OVERLAP
+    from src.config import DATA_PATH, CHUNK_SIZE, CHUNK_OVERLAP
     
     loader = DocumentLoader(DATA_PATH, CHUNK_SIZE, CHUNK_OVERLAP)
     chunks = loader.process_documents()
@@ -0,0 +1,66 @@
+"""
+On-disk cache of document embeddings, so unchanged chunks are not re-embedded
+"""
+
+import hashlib
+import sqlite3
+import threading
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+# Stay under SQLite's limit on bound parameters per statement
+_MAX_PARAMS = 500
+
+
+class EmbeddingCache:
+    """SQLite table of float32 vectors keyed by sha256 of model name + text"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (hash TEXT PRIMARY KEY, model TEXT, dim INT, vec BLOB)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        """Cache key; including the model keeps vectors from different models apart"""
+        return hashlib.sha256((model + "\x00" + text).encode("utf-8")).hexdigest()
+    
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Look up vectors for texts, None for each miss"""
+        keys = [self.key(model, text) for text in texts]
+        found = {}
+        
+        with self._lock:
+            for start in range(0, len(keys), _MAX_PARAMS):
+                batch = keys[start:start + _MAX_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT hash, vec FROM cache WHERE hash IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        
+        return [found.get(key) for key in keys]
+    
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """Store vectors for texts"""
+        rows = []
+        for text, vector in zip(texts, vectors):
+            vector = np.asarray(vector, dtype=np.float32)
+            rows.append((self.key(model, text), model, len(vector), vector.tobytes()))
+        
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cache(hash, model, dim, vec) VALUES(?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+    
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,52 @@
+"""
+Lightweight language guess for short questions
+"""
+
+import re
+
+# Frequent question words per language; a question's language is the one
+# whose words it uses most
+_STOPWORDS = {
+    "en": frozenset({
+        "the", "is", "are", "what", "how", "does", "do", "you", "your", "of", "and", "to",
+        "in", "about", "can", "i", "me", "tell", "with", "for", "who", "where", "which", "a"
+    }),
+    "fi": frozenset({
+        "mikä", "mitä", "miten", "kuinka", "onko", "ja", "on", "ovat", "te", "teillä", "voin",
+        "minä", "mitkä", "missä", "kuka", "kerro", "ei", "että", "se", "tai", "jos", "kanssa"
+    }),
+    "sv": frozenset({
+        "vad", "hur", "är", "och", "det", "som", "för", "med", "kan", "jag", "ni", "vilka",
+        "var", "om", "berätta", "ett", "en", "har", "inte", "vem"
+    }),
+    "de": frozenset({
+        "was", "wie", "ist", "und", "der", "die", "das", "sie", "ich", "ihr", "können",
+        "über", "welche", "ein", "eine", "nicht", "mit", "für", "wer", "wo"
+    }),
+}
+
+# Non-Latin scripts are told apart by their characters alone
+_SCRIPTS = (
+    ("ru", re.compile(r"[Ѐ-ӿ]")),
+    ("ar", re.compile(r"[؀-ۿ]")),
+    ("ja", re.compile(r"[぀-ヿ]")),
+    ("zh", re.compile(r"[一-鿿]")),
+    ("ko", re.compile(r"[가-힯]")),
+)
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def detect_language(text: str) -> str:
+    """Best-guess language code of a question, or "und" when there is no clear winner"""
+    for code, pattern in _SCRIPTS:
+        if pattern.search(text):
+            return code
+    
+    words = _WORD_RE.findall(text.lower())
+    scores = sorted(
+        ((sum(word in stopwords for word in words), code) for code, stopwords in _STOPWORDS.items()),
+        reverse=True
+    )
+    (best, code), (runner_up, _) = scores[0], scores[1]
+    return code if best > runner_up else "und"
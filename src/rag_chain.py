@@ -1,7 +1,23 @@
+import asyncio
 import cohere
-from typing import List, Dict, Optional
+import copy
+import hashlib
+import os
+import threading
+import time
+import traceback
+import weakref
+from collections import OrderedDict
+from typing import List, Dict, Iterator, Optional, Tuple, Union
+import numpy as np
 from langchain_core.documents import Document
 from src.vectorstore import VectorStoreManager
+from src.semantic_cache import SemanticCache
+from src.language import detect_language
+from src.ttl_cache import TTLCache
+
+# Start of the apologies returned in place of an answer when something fails
+FAILURE_ANSWER_PREFIX = "I apologize, but I encountered an error"
 
 
 class RAGChain:
@@ -15,46 +31,274 @@ class RAGChain:
         top_k_retrieval: int = 20,
         top_k_rerank: int = 3,
         temperature: float = 0.3,
-        max_tokens: int = 1000
+        max_tokens: int = 1000,
+        cohere_client: Optional[cohere.Client] = None,
+        cache_size: int = 256,
+        cache_ttl: float = 3600,
+        semantic_cache_tau: float = 0.85,
+        async_cohere_client: Optional[cohere.AsyncClient] = None,
+        max_context_tokens: int = 3000,
+        cohere_rerank_enabled: bool = True,
+        rerank_cache_size: int = 512,
+        rerank_cache_ttl: float = 30,
+        skip_small_rerank: bool = True
     ):
         self.vectorstore_manager = vectorstore_manager
-        self.cohere_client = cohere.Client(cohere_api_key)
+        self.cohere_api_key = cohere_api_key
+        self.cohere_client = cohere_client or cohere.Client(cohere_api_key)
+        self._async_cohere_client = async_cohere_client
+        
+        # Async clients created here, one per event loop: an httpx async pool
+        # cannot be reused once the loop it was opened on has closed
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, cohere.AsyncClient]" = weakref.WeakKeyDictionary()
         self.model = model
         self.top_k_retrieval = top_k_retrieval
         self.top_k_rerank = top_k_rerank
         self.temperature = temperature
         self.max_tokens = max_tokens
+        self.max_context_tokens = max_context_tokens
+        self.cohere_rerank_enabled = cohere_rerank_enabled
+        
+        # With no more candidates than top_k_rerank, reranking cannot drop any, so skip the API call
+        self.skip_small_rerank = skip_small_rerank
+        
+        # Exact-match answer cache: key -> (timestamp, result), oldest first
+        self._answer_cache: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_ttl = cache_ttl
+        self._cache_lock = threading.Lock()
+        
+        # Paraphrase caches over query embeddings, one per rerank setting and question
+        # language: the embeddings are multilingual, so a translated question would
+        # otherwise get the answer written in the other language
+        self._semantic_cache: Dict[Tuple[bool, str], SemanticCache] = {}
+        self._semantic_cache_tau = semantic_cache_tau
+        self._semantic_cache_lock = threading.Lock()
+        
+        # Rerank results keyed by query and candidate ids, so repeated retrievals
+        # within a short burst (agent iterations, RAG and tool asking alike) skip the API
+        self._rerank_cache = TTLCache(max_items=rerank_cache_size, ttl=rerank_cache_ttl)
+        
+        # Reranks currently being fetched, so concurrent identical requests share one API call
+        self._rerank_inflight: Dict[Tuple, threading.Event] = {}
+        self._rerank_inflight_lock = threading.Lock()
         
         # Load vectorstore
         if self.vectorstore_manager.vectorstore is None:
             self.vectorstore_manager.load_vectorstore()
     
-    def retrieve_documents(self, query: str) -> List[Document]:
+    def _cache_key(self, question: str, use_rerank: bool) -> str:
+        normalized = question.strip().lower()
+        return hashlib.sha1(f"{self.model}:{use_rerank}:{normalized}".encode()).hexdigest()
+    
+    def _cache_get(self, key: str) -> Optional[Dict]:
+        with self._cache_lock:
+            entry = self._answer_cache.get(key)
+            if entry is None:
+                return None
+            
+            timestamp, result = entry
+            if time.time() - timestamp >= self._cache_ttl:
+                del self._answer_cache[key]
+                return None
+            
+            self._answer_cache.move_to_end(key)
+            return copy.deepcopy(result)
+    
+    def _cache_put(self, key: str, result: Dict):
+        with self._cache_lock:
+            self._answer_cache[key] = (time.time(), copy.deepcopy(result))
+            self._answer_cache.move_to_end(key)
+            while len(self._answer_cache) > self._cache_size:
+                self._answer_cache.popitem(last=False)
+    
+    def clear_cache(self):
+        """Drop all cached answers, e.g. after documents are added"""
+        with self._cache_lock:
+            self._answer_cache.clear()
+        
+        for semantic_cache in list(self._semantic_cache.values()):
+            semantic_cache.clear()
+        self._rerank_cache.clear()
+    
+    def _semantic_cache_for(self, use_rerank: bool, language: str) -> SemanticCache:
+        """The paraphrase cache for a rerank setting and question language, created on first use"""
+        key = (use_rerank, language)
+        with self._semantic_cache_lock:
+            if key not in self._semantic_cache:
+                self._semantic_cache[key] = SemanticCache(
+                    tau=self._semantic_cache_tau, ttl=self._cache_ttl, max_size=self._cache_size
+                )
+            return self._semantic_cache[key]
+    
+    @staticmethod
+    def _is_answer(result: Dict) -> bool:
+        """Whether a cached result is a real answer rather than an error fallback"""
+        return result.get("error") is None and not result.get("answer", "").startswith(FAILURE_ANSWER_PREFIX)
+    
+    def save_semantic_cache(self, path: str):
+        """Write the semantic answer caches to an .npz file, leaving out error fallbacks"""
+        arrays = {
+            f"{use_rerank}_{language}_{name}": array
+            for (use_rerank, language), semantic_cache in list(self._semantic_cache.items())
+            for name, array in semantic_cache.export(keep=self._is_answer).items()
+        }
+        if arrays:
+            # Answers depend on the chat model, so the file records which one wrote them
+            np.savez(path, model=np.array(self.model), **arrays)
+    
+    def load_semantic_cache(self, path: str) -> int:
+        """Restore the semantic answer caches saved by save_semantic_cache; returns the number of entries loaded"""
+        if not os.path.exists(path):
+            return 0
+        
+        with np.load(path) as saved:
+            if "model" not in saved.files or str(saved["model"]) != self.model:
+                return 0
+            
+            # Entries are named "<use_rerank>_<language>_<array>"
+            groups: Dict[Tuple[bool, str], Dict[str, np.ndarray]] = {}
+            for key in saved.files:
+                parts = key.split("_", 2)
+                if len(parts) == 3 and parts[0] in ("True", "False"):
+                    groups.setdefault((parts[0] == "True", parts[1]), {})[parts[2]] = saved[key]
+            
+            for (use_rerank, language), arrays in groups.items():
+                self._semantic_cache_for(use_rerank, language).restore(arrays)
+        
+        return sum(len(semantic_cache) for semantic_cache in list(self._semantic_cache.values()))
+    
+    def get_async_client(self) -> cohere.AsyncClient:
+        """Async Cohere client for aquery() in the running event loop, created on first use in each loop"""
+        if self._async_cohere_client is not None:
+            return self._async_cohere_client
+        
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = cohere.AsyncClient(self.cohere_api_key)
+        return client
+    
+    def retrieve_documents(self, query: str, query_embedding: Optional[List[float]] = None) -> List[Document]:
         """Retrieve relevant documents using semantic search"""
         print(f"\n🔍 Retrieving documents for query: '{query}'")
         
-        # Semantic search
-        results = self.vectorstore_manager.search(query, k=self.top_k_retrieval)
+        # Semantic search, reusing the query embedding when the caller already has it;
+        # either way the search goes straight to the collection by vector
+        if query_embedding is None:
+            query_embedding = self.vectorstore_manager.embed_query(query)
+        results = self.vectorstore_manager.search_by_vector(query_embedding, k=self.top_k_retrieval)
         
         print(f"✓ Retrieved {len(results)} documents")
         return results
     
+    @staticmethod
+    def _rerank_key(query: str, documents: List[Document]) -> Tuple:
+        return (query, tuple(doc.id or doc.page_content for doc in documents))
+    
+    def _rerank_unneeded(self, documents: List[Document]) -> bool:
+        if self.skip_small_rerank and len(documents) <= self.top_k_rerank:
+            print(f"✓ Only {len(documents)} candidates, skipping rerank")
+            return True
+        return False
+    
+    def _cached_rerank(self, key: Tuple) -> Optional[List[Dict]]:
+        cached = self._rerank_cache.get(key)
+        if cached is not None:
+            print("✓ Rerank served from cache")
+            return list(cached)
+        return None
+    
     def rerank_documents(self, query: str, documents: List[Document]) -> List[Dict]:
         """Rerank documents using Cohere Rerank API"""
         print(f"\n🎯 Reranking top {self.top_k_rerank} documents...")
         
-        # Prepare documents for reranking
-        docs_text = [doc.page_content for doc in documents]
+        if self._rerank_unneeded(documents):
+            return self._unranked(documents)
+        
+        key = self._rerank_key(query, documents)
+        cached = self._cached_rerank(key)
+        if cached is not None:
+            return cached
+        
+        # The first caller for a key fetches; concurrent callers with the same key wait for it
+        with self._rerank_inflight_lock:
+            inflight = self._rerank_inflight.get(key)
+            if inflight is None:
+                self._rerank_inflight[key] = threading.Event()
+        
+        if inflight is not None:
+            inflight.wait()
+            cached = self._cached_rerank(key)
+            if cached is not None:
+                return cached
+            # The first caller failed; fall through and try the API ourselves
+        
+        try:
+            # Prepare documents for reranking
+            docs_text = [doc.page_content for doc in documents]
+            
+            # Call Cohere Rerank API
+            rerank_response = self.cohere_client.rerank(
+                query=query,
+                documents=docs_text,
+                top_n=self.top_k_rerank,
+                model="rerank-multilingual-v3.0"
+            )
+            
+            reranked_docs = self._combine_reranked(documents, rerank_response)
+            self._rerank_cache.put(key, reranked_docs)
+            return list(reranked_docs)
+        
+        finally:
+            if inflight is None:
+                with self._rerank_inflight_lock:
+                    self._rerank_inflight.pop(key).set()
+    
+    async def arerank_documents(self, query: str, documents: List[Document]) -> List[Dict]:
+        """Rerank documents using the async Cohere client"""
+        print(f"\n🎯 Reranking top {self.top_k_rerank} documents...")
+        
+        if self._rerank_unneeded(documents):
+            return self._unranked(documents)
+        
+        key = self._rerank_key(query, documents)
+        cached = self._cached_rerank(key)
+        if cached is not None:
+            return cached
         
-        # Call Cohere Rerank API
-        rerank_response = self.cohere_client.rerank(
+        rerank_response = await self.get_async_client().rerank(
             query=query,
-            documents=docs_text,
+            documents=[doc.page_content for doc in documents],
             top_n=self.top_k_rerank,
             model="rerank-multilingual-v3.0"
         )
         
-        # Combine reranked results with original metadata
+        reranked_docs = self._combine_reranked(documents, rerank_response)
+        self._rerank_cache.put(key, reranked_docs)
+        return list(reranked_docs)
+    
+    def rerank_documents_local(self, query_embedding: List[float], documents: List[Document]) -> List[Dict]:
+        """Rerank documents by cosine similarity of their stored embeddings to the query"""
+        print(f"\n🎯 Reranking top {self.top_k_rerank} documents locally...")
+        
+        by_id = {doc.id: doc for doc in documents}
+        ranked = self.vectorstore_manager.rerank_local(query_embedding, list(by_id), top_n=self.top_k_rerank)
+        
+        reranked_docs = [
+            {
+                "content": by_id[doc_id].page_content,
+                "metadata": by_id[doc_id].metadata,
+                "relevance_score": score
+            }
+            for doc_id, score in ranked
+        ]
+        
+        print(f"✓ Reranked to top {len(reranked_docs)} documents")
+        return reranked_docs
+    
+    def _combine_reranked(self, documents: List[Document], rerank_response) -> List[Dict]:
+        """Combine reranked results with original metadata"""
         reranked_docs = []
         for result in rerank_response.results:
             original_doc = documents[result.index]
@@ -67,21 +311,52 @@ class RAGChain:
         print(f"✓ Reranked to top {len(reranked_docs)} documents")
         return reranked_docs
     
-    def build_context(self, reranked_docs: List[Dict]) -> str:
-        """Build context string from reranked documents"""
-        context_parts = []
-        
-        for i, doc in enumerate(reranked_docs, 1):
-            source = doc["metadata"].get("source", "Unknown")
-            content = doc["content"]
-            score = doc["relevance_score"]
+    def _unranked(self, documents: List[Document]) -> List[Dict]:
+        """Use top-k retrieved documents without reranking"""
+        return [
+            {
+                "content": doc.page_content,
+                "metadata": doc.metadata,
+                "relevance_score": 1.0
+            }
+            for doc in documents[:self.top_k_rerank]
+        ]
+    
+    @staticmethod
+    def _sources(reranked_docs: List[Dict]) -> List[Dict]:
+        """Source entries returned alongside the answer"""
+        return [
+            {
+                "source": doc["metadata"].get("source", "Unknown"),
+                "relevance_score": doc["relevance_score"],
+                "content_preview": doc["content"][:150] + "..."
+            }
+            for doc in reranked_docs
+        ]
+    
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Rough token count; about 4 characters per token for English text"""
+        return len(text) // 4 + 1
+    
+    def _context_parts(self, reranked_docs: List[Dict]) -> Iterator[str]:
+        """Formatted documents, highest scores first, until the token budget is spent"""
+        used_tokens = 0
+        ranked = sorted(reranked_docs, key=lambda doc: doc["relevance_score"], reverse=True)
+        for i, doc in enumerate(ranked, 1):
+            part = f"[Document {i}] (Source: {doc['metadata'].get('source', 'Unknown')}, Relevance: {doc['relevance_score']:.3f})\n{doc['content']}"
+            used_tokens += self.estimate_tokens(part)
             
-            context_parts.append(
-                f"[Document {i}] (Source: {source}, Relevance: {score:.3f})\n{content}"
-            )
-        
-        context = "\n\n".join(context_parts)
-        return context
+            # Always keep the best document; drop the rest once the budget is spent
+            if i > 1 and used_tokens > self.max_context_tokens:
+                print(f"✂️ Context budget reached, dropped {len(ranked) - i + 1} document(s)")
+                return
+            
+            yield part
+    
+    def build_context(self, reranked_docs: List[Dict]) -> str:
+        """Build context string from reranked documents, highest scores first, within the token budget"""
+        return "\n\n".join(self._context_parts(reranked_docs))
     
     def build_prompt(self, query: str, context: str) -> str:
         """Build prompt for LLM"""
@@ -130,18 +405,95 @@ class RAGChain:
             return answer
             
         except Exception as e:
+            # Re-raised so the caller reports the error instead of caching an apology as the answer
             print(f"❌ Error generating response: {e}")
-            return "I apologize, but I encountered an error generating a response. Please try again."
+            raise
     
-    def query(self, question: str, use_rerank: bool = True, chat_history: Optional[List[Dict]] = None) -> Dict:
+    async def agenerate_response(self, prompt: str, chat_history: Optional[List[Dict]] = None) -> str:
+        """Generate response using the async Cohere client"""
+        print("\n💬 Generating response...")
+        
+        api_kwargs = {
+            "message": prompt,
+            "model": self.model,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens
+        }
+        if chat_history:
+            api_kwargs["chat_history"] = chat_history
+        
+        try:
+            response = await self.get_async_client().chat(**api_kwargs)
+            print("✓ Response generated")
+            return response.text
+        
+        except Exception as e:
+            # Re-raised so the caller reports the error instead of caching an apology as the answer
+            print(f"❌ Error generating response: {e}")
+            raise
+    
+    def _cached_answer(
+        self,
+        question: str,
+        use_rerank: bool,
+        cache_key: Optional[str],
+        query_embedding: Optional[List[float]] = None
+    ) -> Tuple[Optional[Dict], Optional[List[float]]]:
+        """Look up the exact then the semantic cache; returns (cached result, query embedding)"""
+        if cache_key is None:
+            return None, query_embedding
+        
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            print("✓ Answer served from cache")
+            return cached, None
+        
+        # Embed once: the vector serves the semantic cache lookup and the search
+        if query_embedding is None:
+            query_embedding = self.vectorstore_manager.embed_query(question)
+        cached = self._semantic_cache_for(use_rerank, detect_language(question)).get(query_embedding)
+        if cached is not None:
+            print("✓ Answer served from semantic cache")
+            self._cache_put(cache_key, cached)
+        return cached, query_embedding
+    
+    def _store_answer(
+        self,
+        question: str,
+        cache_key: Optional[str],
+        use_rerank: bool,
+        query_embedding: Optional[List[float]],
+        result: Dict
+    ):
+        """Cache a result in the exact and semantic caches, but only a successful one"""
+        if cache_key is None or result["error"] is not None:
+            return
+        
+        self._cache_put(cache_key, result)
+        self._semantic_cache_for(use_rerank, detect_language(question)).put(query_embedding, result)
+    
+    def query(
+        self,
+        question: str,
+        use_rerank: bool = True,
+        chat_history: Optional[List[Dict]] = None,
+        query_embedding: Optional[List[float]] = None
+    ) -> Dict:
         """Complete RAG query pipeline"""
         print("\n" + "=" * 60)
         print(f"Processing query: {question}")
         print("=" * 60)
         
+        # Answers that depend on chat history are not reusable
+        cache_key = None if chat_history else self._cache_key(question, use_rerank)
+        
         try:
+            cached, query_embedding = self._cached_answer(question, use_rerank, cache_key, query_embedding)
+            if cached is not None:
+                return cached
+            
             # Step 1: Retrieve documents
-            retrieved_docs = self.retrieve_documents(question)
+            retrieved_docs = self.retrieve_documents(question, query_embedding)
             
             if not retrieved_docs:
                 return {
@@ -154,15 +506,7 @@ class RAGChain:
             if use_rerank:
                 reranked_docs = self.rerank_documents(question, retrieved_docs)
             else:
-                # Use top-k retrieved documents without reranking
-                reranked_docs = [
-                    {
-                        "content": doc.page_content,
-                        "metadata": doc.metadata,
-                        "relevance_score": 1.0
-                    }
-                    for doc in retrieved_docs[:self.top_k_rerank]
-                ]
+                reranked_docs = self._unranked(retrieved_docs)
             
             # Step 3: Build context
             context = self.build_context(reranked_docs)
@@ -174,28 +518,24 @@ class RAGChain:
             answer = self.generate_response(prompt, chat_history)
             
             # Prepare sources
-            sources = [
-                {
-                    "source": doc["metadata"].get("source", "Unknown"),
-                    "relevance_score": doc["relevance_score"],
-                    "content_preview": doc["content"][:150] + "..."
-                }
-                for doc in reranked_docs
-            ]
+            sources = self._sources(reranked_docs)
             
             print("\n" + "=" * 60)
             print("✅ Query completed successfully")
             print("=" * 60)
             
-            return {
+            result = {
                 "answer": answer,
                 "sources": sources,
                 "error": None
             }
             
+            self._store_answer(question, cache_key, use_rerank, query_embedding, result)
+            
+            return result
+            
         except Exception as e:
             print(f"\n❌ Error in RAG pipeline: {e}")
-            import traceback
             traceback.print_exc()
             
             return {
@@ -204,10 +544,186 @@ class RAGChain:
                 "error": str(e)
             }
 
+    
+    async def aquery_batch(self, questions: List[str], use_rerank: bool = True) -> List[Dict]:
+        """Answer several independent questions concurrently on the async client, embedding them all in one API call"""
+        if not questions:
+            return []
+        
+        embed_response = await self.get_async_client().embed(
+            texts=list(questions),
+            model=self.vectorstore_manager.embeddings.model,
+            input_type="search_query"
+        )
+        
+        # gather keeps the results in question order
+        return list(await asyncio.gather(*(
+            self.aquery(question, use_rerank, query_embedding=embedding)
+            for question, embedding in zip(questions, embed_response.embeddings)
+        )))
+    
+    def query_stream(
+        self,
+        question: str,
+        use_rerank: bool = True,
+        chat_history: Optional[List[Dict]] = None
+    ) -> Iterator[Union[str, Dict]]:
+        """Complete RAG query pipeline, streaming the answer.
+        
+        Yields text deltas as they are generated, then one final dict
+        with the same fields as query().
+        """
+        print("\n" + "=" * 60)
+        print(f"Streaming query: {question}")
+        print("=" * 60)
+        
+        # Answers that depend on chat history are not reusable
+        cache_key = None if chat_history else self._cache_key(question, use_rerank)
+        
+        try:
+            cached, query_embedding = self._cached_answer(question, use_rerank, cache_key)
+            if cached is not None:
+                yield cached["answer"]
+                yield cached
+                return
+            
+            retrieved_docs = self.retrieve_documents(question, query_embedding)
+            
+            if not retrieved_docs:
+                answer = "I couldn't find any relevant information to answer your question."
+                yield answer
+                yield {"answer": answer, "sources": [], "error": None}
+                return
+            
+            if use_rerank:
+                reranked_docs = self.rerank_documents(question, retrieved_docs)
+            else:
+                reranked_docs = self._unranked(retrieved_docs)
+            
+            prompt = self.build_prompt(question, self.build_context(reranked_docs))
+            
+            api_kwargs = {
+                "message": prompt,
+                "model": self.model,
+                "temperature": self.temperature,
+                "max_tokens": self.max_tokens
+            }
+            if chat_history:
+                api_kwargs["chat_history"] = chat_history
+            
+            print("\n💬 Generating response...")
+            answer_parts = []
+            for event in self.cohere_client.chat_stream(**api_kwargs):
+                if event.event_type == "text-generation":
+                    answer_parts.append(event.text)
+                    yield event.text
+            
+            print("\n" + "=" * 60)
+            print("✅ Query completed successfully")
+            print("=" * 60)
+            
+            result = {
+                "answer": "".join(answer_parts),
+                "sources": self._sources(reranked_docs),
+                "error": None
+            }
+            
+            self._store_answer(question, cache_key, use_rerank, query_embedding, result)
+            
+            yield result
+        
+        except Exception as e:
+            print(f"\n❌ Error in RAG pipeline: {e}")
+            traceback.print_exc()
+            
+            yield {
+                "answer": "I apologize, but I encountered an error processing your question.",
+                "sources": [],
+                "error": str(e)
+            }
+    
+    async def aquery(
+        self,
+        question: str,
+        use_rerank: bool = True,
+        chat_history: Optional[List[Dict]] = None,
+        query_embedding: Optional[List[float]] = None
+    ) -> Dict:
+        """Complete RAG query pipeline on the async Cohere client, for callers running an event loop"""
+        print("\n" + "=" * 60)
+        print(f"Processing query: {question}")
+        print("=" * 60)
+        
+        # Answers that depend on chat history are not reusable
+        cache_key = None if chat_history else self._cache_key(question, use_rerank)
+        if cache_key is not None:
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                print("✓ Answer served from cache")
+                return cached
+        
+        try:
+            # Embed once: the vector serves the semantic cache lookup and the search
+            if query_embedding is None:
+                embed_response = await self.get_async_client().embed(
+                    texts=[question],
+                    model=self.vectorstore_manager.embeddings.model,
+                    input_type="search_query"
+                )
+                query_embedding = embed_response.embeddings[0]
+            
+            if cache_key is not None:
+                cached = self._semantic_cache_for(use_rerank, detect_language(question)).get(query_embedding)
+                if cached is not None:
+                    print("✓ Answer served from semantic cache")
+                    self._cache_put(cache_key, cached)
+                    return cached
+            
+            # Chroma is synchronous; search off the event loop
+            retrieved_docs = await asyncio.to_thread(self.retrieve_documents, question, query_embedding)
+            
+            if not retrieved_docs:
+                return {
+                    "answer": "I couldn't find any relevant information to answer your question.",
+                    "sources": [],
+                    "error": None
+                }
+            
+            if use_rerank:
+                reranked_docs = await self.arerank_documents(question, retrieved_docs)
+            else:
+                reranked_docs = self._unranked(retrieved_docs)
+            
+            prompt = self.build_prompt(question, self.build_context(reranked_docs))
+            answer = await self.agenerate_response(prompt, chat_history)
+            
+            print("\n" + "=" * 60)
+            print("✅ Query completed successfully")
+            print("=" * 60)
+            
+            result = {
+                "answer": answer,
+                "sources": self._sources(reranked_docs),
+                "error": None
+            }
+            
+            self._store_answer(question, cache_key, use_rerank, query_embedding, result)
+            
+            return result
+        
+        except Exception as e:
+            print(f"\n❌ Error in RAG pipeline: {e}")
+            traceback.print_exc()
+            
+            return {
+                "answer": "I apologize, but I encountered an error processing your question.",
+                "sources": [],
+                "error": str(e)
+            }
 
 if __name__ == "__main__":
     # Test code
-    from config import COHERE_API_KEY, VECTORDB_PATH, COLLECTION_NAME, COHERE_MODEL, TOP_K_RETRIEVAL, TOP_K_RERANK
+    from src.config import COHERE_API_KEY, VECTORDB_PATH, COLLECTION_NAME, COHERE_MODEL, TOP_K_RETRIEVAL, TOP_K_RERANK
     
     print("Initializing RAG Chain...")
     
@@ -0,0 +1,157 @@
+"""
+Semantic answer cache: reuse answers for paraphrased questions
+"""
+
+import copy
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import orjson
+
+# Optional: SIMD int8 cosine kernels; without it the lookup is a NumPy matrix-vector product
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
+
+def quantize(vector: np.ndarray):
+    """Scalar-quantize a vector to int8 with its own scale; returns (codes, scale)"""
+    peak = float(np.abs(vector).max()) if len(vector) else 0.0
+    scale = peak / 127 if peak > 0 else 1.0
+    return np.round(vector / scale).astype(np.int8), scale
+
+
+def cosine_scores(matrix: np.ndarray, scales: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Score every int8 row against the query; rows and query are pre-normalized, so the dot is the cosine"""
+    if simsimd is not None:
+        # Cosine directly on the int8 codes (the query is quantized the same way),
+        # without upcasting the matrix to float
+        codes, _ = quantize(query)
+        return 1 - np.asarray(simsimd.cdist(codes[None, :], matrix, metric="cosine"), dtype=np.float32)[0]
+    
+    return (matrix @ query) * scales
+
+
+class SemanticCache:
+    """Answer cache matched by cosine similarity of query embeddings"""
+    
+    def __init__(self, tau: float = 0.85, ttl: float = 3600, max_size: int = 256):
+        self.tau = tau
+        self.ttl = ttl
+        self.max_size = max_size
+        
+        # Fixed slots: one contiguous int8 matrix of quantized normalized vectors
+        # (allocated once the dimension is known, 1 byte per dimension) plus
+        # per-slot scales and bookkeeping
+        self._matrix: Optional[np.ndarray] = None
+        self._scales = np.ones(max_size, dtype=np.float32)
+        self._values: List[Any] = [None] * max_size
+        self._timestamps = np.zeros(max_size)
+        self._last_used = np.zeros(max_size, dtype=np.int64)
+        self._valid = np.zeros(max_size, dtype=bool)
+        self._clock = 0
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return int(self._valid.sum())
+    
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+    
+    def _touch(self, slot: int):
+        self._clock += 1
+        self._last_used[slot] = self._clock
+    
+    def _invalidate(self, slot: int):
+        self._valid[slot] = False
+        self._values[slot] = None
+    
+    def get(self, embedding) -> Optional[Any]:
+        """Return a copy of the value stored for the most similar query, if similar enough"""
+        query = self._normalize(embedding)
+        
+        with self._lock:
+            if self._matrix is None or not self._valid.any():
+                return None
+            
+            scores = cosine_scores(self._matrix, self._scales, query)
+            scores[~self._valid] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] < self.tau:
+                return None
+            
+            if time.time() - self._timestamps[best] >= self.ttl:
+                self._invalidate(best)
+                return None
+            
+            self._touch(best)
+            return copy.deepcopy(self._values[best])
+    
+    def put(self, embedding, value: Any):
+        """Store a value for a query embedding, evicting the least recently used entry when full"""
+        vector = self._normalize(embedding)
+        
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_size, len(vector)), dtype=np.int8)
+            
+            free = np.flatnonzero(~self._valid)
+            slot = int(free[0]) if len(free) else int(np.argmin(self._last_used))
+            
+            self._matrix[slot], self._scales[slot] = quantize(vector)
+            self._values[slot] = copy.deepcopy(value)
+            self._timestamps[slot] = time.time()
+            self._valid[slot] = True
+            self._touch(slot)
+    
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._valid[:] = False
+            self._values = [None] * self.max_size
+    
+    def export(self, keep: Optional[Callable[[Any], bool]] = None) -> Dict[str, np.ndarray]:
+        """Snapshot of the cache as plain arrays (values JSON-encoded), e.g. for np.savez.
+        
+        Entries whose value fails keep(value) are left out of the snapshot.
+        """
+        with self._lock:
+            if self._matrix is None:
+                return {}
+            
+            valid = self._valid.copy()
+            values = list(self._values)
+            if keep is not None:
+                for slot in np.flatnonzero(valid):
+                    if not keep(values[slot]):
+                        valid[slot] = False
+                        values[slot] = None
+            
+            return {
+                "matrix": self._matrix.copy(),
+                "scales": self._scales.copy(),
+                "timestamps": self._timestamps.copy(),
+                "valid": valid,
+                "values": np.frombuffer(orjson.dumps(values, option=orjson.OPT_SERIALIZE_NUMPY), dtype=np.uint8)
+            }
+    
+    def restore(self, arrays: Dict[str, np.ndarray]) -> bool:
+        """Load a snapshot from export(); expired entries stay expired. Returns False if it does not fit"""
+        if "matrix" not in arrays or len(arrays["matrix"]) != self.max_size:
+            return False
+        
+        with self._lock:
+            self._matrix = np.array(arrays["matrix"], dtype=np.int8)
+            self._scales = np.array(arrays["scales"], dtype=np.float32)
+            self._timestamps = np.array(arrays["timestamps"])
+            self._valid = np.array(arrays["valid"], dtype=bool)
+            self._values = orjson.loads(arrays["values"].tobytes())
+            self._last_used = np.zeros(self.max_size, dtype=np.int64)
+            self._clock = 0
+        return True
@@ -2,9 +2,13 @@
 Agent tools for different functionalities
 """
 
-from typing import List, Dict, Any
-import json
+from typing import List, Dict, Any, Tuple
+import ast
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+
+from src.semantic_cache import SemanticCache
 
 
 class KnowledgeBaseTool:
@@ -15,16 +19,42 @@ class KnowledgeBaseTool:
     products, company information, and frequently asked questions. 
     Use this when the user asks about Digia's business, offerings, or company details."""
     
-    def __init__(self, rag_chain):
+    def __init__(self, rag_chain, cache_tau: float = 0.95, cache_size: int = 1024, cache_ttl: float = 3600):
         self.rag_chain = rag_chain
+        
+        # Near-identical queries (cosine >= cache_tau) reuse the earlier result
+        self.cache = SemanticCache(tau=cache_tau, ttl=cache_ttl, max_size=cache_size)
+        
+        # Searches of one batch are I/O bound (Chroma + rerank API), so they run side by side
+        self._pool = ThreadPoolExecutor(max_workers=4)
     
     def run(self, query: str) -> dict:
         """Execute knowledge base search - returns context only, not final answer"""
         print(f"🔧 Using tool: {self.name}")
         print(f"   Query: {query}")
         
+        # Embed once: the vector serves the cache lookup and the search
+        query_embedding = self.rag_chain.vectorstore_manager.embed_query(query)
+        return self._search(query, query_embedding)
+    
+    def run_batch(self, queries: List[str]) -> List[dict]:
+        """Execute several knowledge base searches with one embedding call, results in query order"""
+        print(f"🔧 Using tool: {self.name} ({len(queries)} queries)")
+        for query in queries:
+            print(f"   Query: {query}")
+        
+        query_embeddings = self.rag_chain.vectorstore_manager.embed_queries(queries)
+        return list(self._pool.map(self._search, queries, query_embeddings))
+    
+    def _search(self, query: str, query_embedding: List[float]) -> dict:
+        """Retrieve, rerank and format the context for one embedded query"""
+        cached = self.cache.get(query_embedding)
+        if cached is not None:
+            print("   ✓ Served from knowledge base cache")
+            return cached
+        
         # Only retrieve and rerank documents, don't generate answer yet
-        retrieved_docs = self.rag_chain.retrieve_documents(query)
+        retrieved_docs = self.rag_chain.retrieve_documents(query, query_embedding)
         
         if not retrieved_docs:
             return {
@@ -32,34 +62,57 @@ class KnowledgeBaseTool:
                     "sources": []
             }
         
-        # Rerank documents
-        reranked_docs = self.rag_chain.rerank_documents(query, retrieved_docs)
+        # Rerank documents, through the Cohere API or locally against the stored embeddings
+        if self.rag_chain.cohere_rerank_enabled:
+            reranked_docs = self.rag_chain.rerank_documents(query, retrieved_docs)
+        else:
+            reranked_docs = self.rag_chain.rerank_documents_local(query_embedding, retrieved_docs)
         
-        # Return formatted context for the agent to use
-        context_parts = []
-        sources = []
-        for i, doc in enumerate(reranked_docs, 1):
-            source = doc["metadata"].get("source", "Unknown")
-            content = doc["content"]
-            score = doc["relevance_score"]
-            
-            context_parts.append(
-                f"[Source {i}: {source}] (Relevance: {score:.2f})\n{content}"
-            )
-
-            sources.append({
-                "source": source, 
-                "relevance_score": score, 
-                "content_preview": content[:150] + "..."
-            })
-        
-        context = "\n\n".join(context_parts)
+        # Return formatted context for the agent to use; each document's fields are read once
+        fields = [
+            (doc["metadata"].get("source", "Unknown"), doc["content"], doc["relevance_score"])
+            for doc in reranked_docs
+        ]
+        context = "\n\n".join([
+            f"[Source {i}: {source}] (Relevance: {score:.2f})\n{content}"
+            for i, (source, content, score) in enumerate(fields, 1)
+        ])
+        sources = [
+            {"source": source, "relevance_score": score, "content_preview": content[:150] + "..."}
+            for source, content, score in fields
+        ]
         
-        return {
+        result = {
             "context": f"Here is the relevant information from the knowledge base:\n\n{context}",
             "sources": sources
         }
+        self.cache.put(query_embedding, result)
+        
+        return result
+
+
+
+# Characters a calculator expression may contain; translate() with this table
+# deletes them all, so anything left over is invalid
+_CALC_DELETE_TABLE = str.maketrans("", "", "0123456789+-*/.()\n ")
 
+# AST nodes a calculator expression may contain: numbers and + - * / only
+_CALC_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.USub, ast.UAdd
+)
+
+
+@lru_cache(maxsize=256)
+def _compile_expression(expression: str):
+    """Parse and compile an arithmetic expression once, rejecting anything but numbers and basic operators"""
+    tree = ast.parse(expression.strip(), mode="eval")
+    for node in ast.walk(tree):
+        if not isinstance(node, _CALC_NODES):
+            raise ValueError(f"unsupported syntax '{type(node).__name__}'")
+        if isinstance(node, ast.Constant) and type(node.value) not in (int, float):
+            raise ValueError(f"unsupported constant {node.value!r}")
+    return compile(tree, "<calc>", "eval")
 
 
 class CalculatorTool:
@@ -78,14 +131,13 @@ class CalculatorTool:
         try:
             # Safely evaluate mathematical expression
             # Only allow basic math operations
-            allowed_chars = set("0123456789+-*/.()\n ")
-            if not all(c in allowed_chars for c in expression):
+            if expression.translate(_CALC_DELETE_TABLE):
                 return {
                     "context": "Error: Invalid characters in expression. Only numbers and basic operators (+, -, *, /, parentheses) are allowed.",
                     "sources": None
                 }
             
-            result = eval(expression)
+            result = eval(_compile_expression(expression), {"__builtins__": {}}, {})
             return {
                 "context": f"Result: {result}",
                 "sources": None 
@@ -105,64 +157,80 @@ class CurrentTimeTool:
     description = """Get the current date and time.
     Use this when the user asks about the current time, date, day of week, or year."""
     
+    # The whole context in one format string, so it takes a single strftime call
+    _FORMAT = (
+        "Current date and time information:\n- Date: %Y-%m-%d\n- Time: %H:%M:%S"
+        "\n- Day of week: %A\n- Full: %B %d, %Y at %I:%M %p"
+    )
+    
+    def __init__(self):
+        # (second, context) of the last call; calls within the same second reuse it
+        self._last = (None, "")
+    
     def run(self, query: str = "") -> dict:
         """Get current time"""
         print(f"🔧 Using tool: {self.name}")
         
         now = datetime.now()
+        second = int(now.timestamp())
+        last_second, context = self._last
+        if second != last_second:
+            context = now.strftime(self._FORMAT)
+            self._last = (second, context)
         
         return {
-            "context": f"Current date and time information:\n- Date: {now.strftime('%Y-%m-%d')}\n- Time: {now.strftime('%H:%M:%S')}\n- Day of week: {now.strftime('%A')}\n- Full: {now.strftime('%B %d, %Y at %I:%M %p')}",
+            "context": context,
             "sources": None
         }
 
 
 
 
-def get_tool_definitions() -> List[Dict[str, Any]]:
-    """Get tool definitions in the format required by Cohere"""
-    
-    tools = [
-        {
-            "name": "knowledge_base_search",
-            "description": """Search the Digia company knowledge base for information about services, 
+# Tool definitions in the format required by Cohere, built once and shared
+_TOOL_DEFS = (
+    {
+        "name": "knowledge_base_search",
+        "description": """Search the Digia company knowledge base for information about services, 
             products, company information, and frequently asked questions. 
             Use this when the user asks about Digia's business, offerings, or company details.""",
-            "parameter_definitions": {
-                "query": {
-                    "description": "The search query to find relevant information in the knowledge base",
-                    "type": "str",
-                    "required": True
-                }
+        "parameter_definitions": {
+            "query": {
+                "description": "The search query to find relevant information in the knowledge base",
+                "type": "str",
+                "required": True
             }
-        },
-        {
-            "name": "calculator",
-            "description": """Perform mathematical calculations. 
+        }
+    },
+    {
+        "name": "calculator",
+        "description": """Perform mathematical calculations. 
             Use this when the user asks to calculate numbers, percentages, or other mathematical operations.""",
-            "parameter_definitions": {
-                "expression": {
-                    "description": "Mathematical expression to evaluate, e.g., '100 * 1.2' or '(500 + 300) / 2'",
-                    "type": "str",
-                    "required": True
-                }
+        "parameter_definitions": {
+            "expression": {
+                "description": "Mathematical expression to evaluate, e.g., '100 * 1.2' or '(500 + 300) / 2'",
+                "type": "str",
+                "required": True
             }
-        },
-        {
-            "name": "current_time",
-            "description": """Get the current date and time.
+        }
+    },
+    {
+        "name": "current_time",
+        "description": """Get the current date and time.
             Use this when the user asks about the current time, date, day of week, or year.""",
-            "parameter_definitions": {
-                "query": {
-                    "description": "Optional query about what time information is needed",
-                    "type": "str",
-                    "required": False
-                }
+        "parameter_definitions": {
+            "query": {
+                "description": "Optional query about what time information is needed",
+                "type": "str",
+                "required": False
             }
         }
-    ]
-    
-    return tools
+    }
+)
+
+
+def get_tool_definitions() -> Tuple[Dict[str, Any], ...]:
+    """Get tool definitions in the format required by Cohere (shared; do not modify)"""
+    return _TOOL_DEFS
 
 
 if __name__ == "__main__":
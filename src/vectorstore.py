@@ -2,38 +2,128 @@ import cohere
 from langchain_cohere import CohereEmbeddings
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import orjson
 import os
+import threading
+import uuid
+
+EMBEDDING_MODEL = "embed-multilingual-v3.0"  # Supports multiple languages
+
+# Normalized chunk embeddings (float16) and their ids, saved next to the Chroma files
+EMBEDDINGS_FILE = "embeddings.f16.npy"
+EMBEDDING_IDS_FILE = "embeddings.ids.json"
+
+# CohereEmbeddings instances by (api_key, model), reused across managers
+_EMBEDDINGS_CACHE = {}
+_EMBEDDINGS_CACHE_LOCK = threading.Lock()
+
+
+def get_embeddings(api_key: str, model: str = EMBEDDING_MODEL) -> CohereEmbeddings:
+    """Get the shared Cohere embeddings for an API key and model, creating them on first use"""
+    key = (api_key, model)
+    with _EMBEDDINGS_CACHE_LOCK:
+        if key not in _EMBEDDINGS_CACHE:
+            _EMBEDDINGS_CACHE[key] = CohereEmbeddings(cohere_api_key=api_key, model=model)
+        return _EMBEDDINGS_CACHE[key]
+
+
+def top_k_indices(scores: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+    """Indices of the k highest scores along the last axis, best first; partitions before sorting only those k"""
+    n = scores.shape[-1]
+    k = n if k is None else min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.intp)
+    
+    top = np.argpartition(-scores, k - 1, axis=-1)[..., :k] if k < n else np.broadcast_to(np.arange(n), scores.shape)
+    return np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=-1), axis=-1, kind="stable"), axis=-1)
+
 
 class VectorStoreManager:
     """Vector database manager"""
     
-    def __init__(self, api_key: str, persist_directory: str, collection_name: str):
+    def __init__(
+        self,
+        api_key: str,
+        persist_directory: str,
+        collection_name: str,
+        cohere_client: Optional[cohere.Client] = None,
+        mmap_search: bool = False
+    ):
         self.api_key = api_key
         self.persist_directory = persist_directory
         self.collection_name = collection_name
         
-        # Initialize Cohere embeddings
-        self.embeddings = CohereEmbeddings(
-            cohere_api_key=api_key,
-            model="embed-multilingual-v3.0"  # Supports multiple languages
-        )
+        # Initialize Cohere embeddings; a given client (and its connection pool)
+        # is set on a private instance so the shared one is left untouched
+        if cohere_client is not None:
+            self.embeddings = CohereEmbeddings(cohere_api_key=api_key, model=EMBEDDING_MODEL)
+            self.embeddings.client = cohere_client
+        else:
+            self.embeddings = get_embeddings(api_key)
         
         self.vectorstore = None
+        
+        # All chunk embeddings as one L2-normalized matrix (row per chunk) for
+        # local reranking, memory-mapped from the saved file or read from the
+        # collection on first use
+        self._matrix: Optional[np.ndarray] = None
+        self._ids: List[str] = []
+        self._row_of: Dict[str, int] = {}
+        self._matrix_lock = threading.Lock()
+        
+        # Search by scanning the memory-mapped matrix instead of the HNSW index;
+        # only used while the saved file covers the whole collection
+        self.mmap_search = mmap_search
+        self._mmap_ready = False
     
-    def create_vectorstore(self, documents: List[Document]) -> Chroma:
-        """Create vector database"""
+    def create_vectorstore(
+        self,
+        documents: List[Document],
+        embeddings: Optional[Sequence[Sequence[float]]] = None,
+        batch_size: int = 5000
+    ) -> Chroma:
+        """Create vector database, optionally from precomputed embeddings"""
         print("\nCreating vector database...")
         print(f"Number of documents: {len(documents)}")
         print(f"Storage path: {self.persist_directory}")
         
-        # Create vector database
-        self.vectorstore = Chroma.from_documents(
-            documents=documents,
-            embedding=self.embeddings,
-            persist_directory=self.persist_directory,
-            collection_name=self.collection_name
-        )
+        if embeddings is None:
+            # Create vector database, embedding through LangChain
+            self.vectorstore = Chroma.from_documents(
+                documents=documents,
+                embedding=self.embeddings,
+                persist_directory=self.persist_directory,
+                collection_name=self.collection_name
+            )
+        else:
+            if len(embeddings) != len(documents):
+                raise ValueError("Number of embeddings does not match number of documents")
+            
+            # Open (or create) the collection and insert the vectors directly
+            self.vectorstore = Chroma(
+                persist_directory=self.persist_directory,
+                embedding_function=self.embeddings,
+                collection_name=self.collection_name
+            )
+            ids = [doc.id or str(uuid.uuid4()) for doc in documents]
+            texts = [doc.page_content for doc in documents]
+            metadatas = [doc.metadata for doc in documents]
+            
+            # One add per large batch amortizes index locking and SQLite commits;
+            # Chroma rejects batches above its own maximum
+            batch_size = min(batch_size, self.vectorstore._client.get_max_batch_size())
+            for i in range(0, len(documents), batch_size):
+                self.vectorstore._collection.add(
+                    ids=ids[i:i + batch_size],
+                    embeddings=embeddings[i:i + batch_size],
+                    documents=texts[i:i + batch_size],
+                    metadatas=metadatas[i:i + batch_size]
+                )
+        
+        self._save_embedding_matrix()
+        self._mmap_ready = self.mmap_search
         
         print("✓ Vector database created successfully!")
         return self.vectorstore
@@ -50,7 +140,13 @@ class VectorStoreManager:
                 embedding_function=self.embeddings,
                 collection_name=self.collection_name
             )
-            print(f"✓ Loaded vector database with {self.vectorstore._collection.count()} documents")
+            count = self.vectorstore._collection.count()
+            print(f"✓ Loaded vector database with {count} documents")
+            
+            if self.mmap_search and os.path.exists(os.path.join(self.persist_directory, EMBEDDINGS_FILE)):
+                with self._matrix_lock:
+                    self._load_embedding_matrix()
+                    self._mmap_ready = len(self._ids) == count
             return self.vectorstore
         except Exception as e:
             print(f"Failed to load vector database: {e}")
@@ -62,8 +158,27 @@ class VectorStoreManager:
             raise ValueError("Please create or load vector database first")
         
         self.vectorstore.add_documents(documents)
+        self._mmap_ready = False
         print(f"✓ Added {len(documents)} documents")
     
+    def count(self) -> int:
+        """Number of vectors in the collection"""
+        if self.vectorstore is None:
+            raise ValueError("Please create or load vector database first")
+        
+        return self.vectorstore._collection.count()
+    
+    def warm_up(self):
+        """Page in the HNSW index and open the Cohere connection before the first real query"""
+        if self.vectorstore is None:
+            raise ValueError("Please create or load vector database first")
+        
+        sample = self.vectorstore._collection.get(limit=1, include=["embeddings"])
+        if len(sample["embeddings"]):
+            self.vectorstore._collection.query(query_embeddings=[sample["embeddings"][0]], n_results=1)
+        
+        self.embeddings.embed_query("warmup")
+    
     def search(self, query: str, k: int = 5) -> List[Document]:
         """Search for relevant documents"""
         if self.vectorstore is None:
@@ -72,6 +187,74 @@ class VectorStoreManager:
         results = self.vectorstore.similarity_search(query, k=k)
         return results
     
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a search query"""
+        return self.embeddings.embed_query(query)
+    
+    def _query_by_vectors(self, embeddings: Sequence[Sequence[float]], k: int) -> List[List[Document]]:
+        """One Chroma query for several embeddings, fetching only documents and metadata"""
+        if self._mmap_ready:
+            return self._scan_by_vectors(embeddings, k)
+        
+        results = self.vectorstore._collection.query(
+            query_embeddings=[list(embedding) for embedding in embeddings],
+            n_results=k,
+            include=["documents", "metadatas"]
+        )
+        return [
+            [
+                Document(page_content=text, metadata=metadata or {}, id=doc_id)
+                for doc_id, text, metadata in zip(ids, texts, metadatas)
+            ]
+            for ids, texts, metadatas in zip(results["ids"], results["documents"], results["metadatas"])
+        ]
+    
+    def _scan_by_vectors(self, embeddings: Sequence[Sequence[float]], k: int) -> List[List[Document]]:
+        """Exact nearest neighbours from the memory-mapped matrix, then one Chroma read for their texts"""
+        with self._matrix_lock:
+            matrix, ids = self._matrix, self._ids
+        queries = np.asarray(embeddings, dtype=np.float32)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        
+        # Pages of the file are read on demand and stay in the OS page cache between runs
+        scores = queries @ matrix.T
+        order = top_k_indices(scores, k)
+        
+        hit_ids = [[ids[row] for row in rows] for rows in order]
+        stored = self.vectorstore._collection.get(
+            ids=list({doc_id for row in hit_ids for doc_id in row}),
+            include=["documents", "metadatas"]
+        )
+        by_id = {
+            doc_id: (text, metadata)
+            for doc_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        }
+        return [
+            [
+                Document(page_content=by_id[doc_id][0], metadata=by_id[doc_id][1] or {}, id=doc_id)
+                for doc_id in row if doc_id in by_id
+            ]
+            for row in hit_ids
+        ]
+    
+    def search_by_vector(self, embedding: List[float], k: int = 5) -> List[Document]:
+        """Search for relevant documents with an already computed query embedding"""
+        if self.vectorstore is None:
+            raise ValueError("Please create or load vector database first")
+        
+        return self._query_by_vectors([embedding], k)[0]
+    
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed several search queries in one API call"""
+        return self.embeddings.embed(queries, input_type="search_query")
+    
+    def search_many(self, queries: List[str], k: int = 5) -> List[List[Document]]:
+        """Search for several queries, embedding them all in one API call"""
+        if self.vectorstore is None:
+            raise ValueError("Please create or load vector database first")
+        
+        return self._query_by_vectors(self.embed_queries(queries), k)
+    
     def search_with_score(self, query: str, k: int = 5):
         """Search and return similarity scores"""
         if self.vectorstore is None:
@@ -80,16 +263,110 @@ class VectorStoreManager:
         results = self.vectorstore.similarity_search_with_score(query, k=k)
         return results
     
+    def _load_embedding_matrix(self, from_file: bool = True):
+        """Load the normalized matrix, memory-mapping the saved float16 file when there is one"""
+        matrix_path = os.path.join(self.persist_directory, EMBEDDINGS_FILE)
+        ids_path = os.path.join(self.persist_directory, EMBEDDING_IDS_FILE)
+        
+        if from_file and os.path.exists(matrix_path) and os.path.exists(ids_path):
+            self._matrix = np.load(matrix_path, mmap_mode="r")
+            with open(ids_path, "rb") as f:
+                ids = orjson.loads(f.read())
+        else:
+            # Full scan of the collection
+            stored = self.vectorstore._collection.get(include=["embeddings"])
+            matrix = np.asarray(stored["embeddings"], dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            self._matrix = matrix / np.where(norms > 0, norms, 1)
+            ids = stored["ids"]
+        
+        self._ids = list(ids)
+        self._row_of = {doc_id: row for row, doc_id in enumerate(ids)}
+    
+    def _save_embedding_matrix(self):
+        """Write the collection's normalized embeddings as float16, half the bytes of float32"""
+        with self._matrix_lock:
+            self._load_embedding_matrix(from_file=False)
+            np.save(os.path.join(self.persist_directory, EMBEDDINGS_FILE), self._matrix.astype(np.float16))
+            with open(os.path.join(self.persist_directory, EMBEDDING_IDS_FILE), "wb") as f:
+                f.write(orjson.dumps(self._ids))
+    
+    def rerank_local(
+        self,
+        query_embedding: Sequence[float],
+        candidate_ids: Sequence[str],
+        top_n: Optional[int] = None
+    ) -> List[Tuple[str, float]]:
+        """Order candidate chunks by cosine similarity to the query, without an API call; returns (id, score) pairs"""
+        if self.vectorstore is None:
+            raise ValueError("Please create or load vector database first")
+        
+        with self._matrix_lock:
+            if self._matrix is None:
+                self._load_embedding_matrix()
+            
+            # Rescan the collection when chunks were added since the matrix was built or saved
+            if any(doc_id not in self._row_of for doc_id in candidate_ids):
+                self._load_embedding_matrix(from_file=False)
+            matrix, row_of = self._matrix, self._row_of
+        
+        ids = [doc_id for doc_id in candidate_ids if doc_id in row_of]
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+        
+        # Only the candidate rows are upcast to float32 for the product
+        candidates = np.asarray(matrix[[row_of[doc_id] for doc_id in ids]], dtype=np.float32)
+        scores = candidates @ query
+        order = top_k_indices(scores, top_n)
+        return [(ids[i], float(scores[i])) for i in order]
+    
     def delete_collection(self):
         """Delete entire collection"""
         if self.vectorstore is not None:
             self.vectorstore.delete_collection()
+            
+            with self._matrix_lock:
+                self._matrix = None
+                self._ids = []
+                self._row_of = {}
+                self._mmap_ready = False
+                for name in (EMBEDDINGS_FILE, EMBEDDING_IDS_FILE):
+                    path = os.path.join(self.persist_directory, name)
+                    if os.path.exists(path):
+                        os.remove(path)
             print("✓ Vector database deleted")
 
 
+# Process-wide manager shared by every Streamlit session and rerun
+_SHARED_MANAGER: Optional[VectorStoreManager] = None
+_SHARED_MANAGER_LOCK = threading.Lock()
+
+
+def get_shared_manager(
+    api_key: str,
+    persist_directory: str,
+    collection_name: str,
+    cohere_client: Optional[cohere.Client] = None
+) -> VectorStoreManager:
+    """Get the shared vector database manager, creating it on first use"""
+    global _SHARED_MANAGER
+    
+    if _SHARED_MANAGER is None:
+        with _SHARED_MANAGER_LOCK:
+            if _SHARED_MANAGER is None:
+                _SHARED_MANAGER = VectorStoreManager(
+                    api_key=api_key,
+                    persist_directory=persist_directory,
+                    collection_name=collection_name,
+                    cohere_client=cohere_client
+                )
+    
+    return _SHARED_MANAGER
+
+
 if __name__ == "__main__":
     # Test code
-    from config import COHERE_API_KEY, VECTORDB_PATH, COLLECTION_NAME
+    from src.config import COHERE_API_KEY, VECTORDB_PATH, COLLECTION_NAME
     
     manager = VectorStoreManager(
         api_key=COHERE_API_KEY,
@@ -3,11 +3,9 @@ Test script for Agent system
 Run this to test the agent's tool calling and reasoning capabilities
 """
 
-import sys
 import os
-
-# Add src directory to path
-sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+from functools import lru_cache
+from typing import TYPE_CHECKING, Tuple
 
 from src.config import (
     COHERE_API_KEY,
@@ -15,12 +13,20 @@ from src.config import (
     COLLECTION_NAME,
     COHERE_MODEL
 )
-from src.vectorstore import VectorStoreManager
-from src.rag_chain import RAGChain
-from src.agent import DigiaAgent
+
+# The cohere/chromadb/langchain stack is imported in _build_agent(), after
+# the environment checks, so a failed check returns without loading it
+if TYPE_CHECKING:
+    from src.agent import DigiaAgent
+    from src.rag_chain import RAGChain
+    from src.vectorstore import VectorStoreManager
+
+
+# Inputs that leave interactive mode
+_EXIT_TOKENS = frozenset({"quit", "exit", "q"})
 
 
-def test_knowledge_base_tool(agent: DigiaAgent):
+def test_knowledge_base_tool(agent: "DigiaAgent"):
     """Test knowledge base search tool"""
     print("\n" + "=" * 60)
     print("TEST 1: Knowledge Base Tool")
@@ -44,7 +50,7 @@ def test_knowledge_base_tool(agent: DigiaAgent):
         print(f"Iterations: {result['iterations']}")
 
 
-def test_calculator_tool(agent: DigiaAgent):
+def test_calculator_tool(agent: "DigiaAgent"):
     """Test calculator tool"""
     print("\n" + "=" * 60)
     print("TEST 2: Calculator Tool")
@@ -67,7 +73,7 @@ def test_calculator_tool(agent: DigiaAgent):
         print(f"Tool calls made: {result['tool_calls_made']}")
 
 
-def test_time_tool(agent: DigiaAgent):
+def test_time_tool(agent: "DigiaAgent"):
     """Test current time tool"""
     print("\n" + "=" * 60)
     print("TEST 3: Current Time Tool")
@@ -89,7 +95,7 @@ def test_time_tool(agent: DigiaAgent):
         print(f"\nAnswer: {result['answer']}")
 
 
-def test_contact_tool(agent: DigiaAgent):
+def test_contact_tool(agent: "DigiaAgent"):
     """Test contact information tool"""
     print("\n" + "=" * 60)
     print("TEST 4: Contact Information Tool")
@@ -111,7 +117,7 @@ def test_contact_tool(agent: DigiaAgent):
         print(f"\nAnswer: {result['answer']}")
 
 
-def test_multi_tool_queries(agent: DigiaAgent):
+def test_multi_tool_queries(agent: "DigiaAgent"):
     """Test queries that require multiple tools"""
     print("\n" + "=" * 60)
     print("TEST 5: Multi-Tool Queries")
@@ -135,7 +141,7 @@ def test_multi_tool_queries(agent: DigiaAgent):
         print(f"Iterations: {result['iterations']}")
 
 
-def test_conversation_flow(agent: DigiaAgent):
+def test_conversation_flow(agent: "DigiaAgent"):
     """Test multi-turn conversation"""
     print("\n" + "=" * 60)
     print("TEST 6: Multi-Turn Conversation")
@@ -162,7 +168,7 @@ def test_conversation_flow(agent: DigiaAgent):
         chat_history = result['chat_history']
 
 
-def test_edge_cases(agent: DigiaAgent):
+def test_edge_cases(agent: "DigiaAgent"):
     """Test edge cases and error handling"""
     print("\n" + "=" * 60)
     print("TEST 7: Edge Cases")
@@ -186,7 +192,7 @@ def test_edge_cases(agent: DigiaAgent):
             print(f"Error: {result['error']}")
 
 
-def interactive_mode(agent: DigiaAgent):
+def interactive_mode(agent: "DigiaAgent"):
     """Interactive testing mode"""
     print("\n" + "=" * 60)
     print("INTERACTIVE MODE")
@@ -203,7 +209,7 @@ def interactive_mode(agent: DigiaAgent):
     while True:
         query = input("\n\nYou: ").strip()
         
-        if query.lower() in ['quit', 'exit', 'q']:
+        if query.lower() in _EXIT_TOKENS:
             print("\nExiting interactive mode...")
             break
         
@@ -222,6 +228,50 @@ def interactive_mode(agent: DigiaAgent):
             print(f"\n[Used tools in {result['iterations']} iteration(s)]")
 
 
+@lru_cache(maxsize=1)
+def _build_agent() -> Tuple["DigiaAgent", "RAGChain", "VectorStoreManager"]:
+    """Build the agent system once per process, so every test shares its clients and caches"""
+    import cohere
+    from src.vectorstore import VectorStoreManager
+    from src.rag_chain import RAGChain
+    from src.agent import DigiaAgent
+    
+    # One client, and so one keep-alive connection pool, for embed, rerank and chat
+    cohere_client = cohere.Client(COHERE_API_KEY)
+    
+    # Initialize RAG chain
+    vectorstore_manager = VectorStoreManager(
+        api_key=COHERE_API_KEY,
+        persist_directory=VECTORDB_PATH,
+        collection_name=COLLECTION_NAME,
+        cohere_client=cohere_client
+    )
+    
+    rag_chain = RAGChain(
+        vectorstore_manager=vectorstore_manager,
+        cohere_api_key=COHERE_API_KEY,
+        model=COHERE_MODEL,
+        cohere_client=cohere_client
+    )
+    
+    # Initialize agent
+    agent = DigiaAgent(
+        cohere_api_key=COHERE_API_KEY,
+        rag_chain=rag_chain,
+        model=COHERE_MODEL,
+        cohere_client=cohere_client
+    )
+    
+    # Page in the index and open the embedding connection before the first test;
+    # optional, so a failure here only costs the first test its warm start
+    try:
+        vectorstore_manager.warm_up()
+    except Exception as e:
+        print(f"⚠️ Warm-up skipped: {e}")
+    
+    return agent, rag_chain, vectorstore_manager
+
+
 def main():
     """Main test function"""
     print("\n" + "=" * 70)
@@ -243,25 +293,7 @@ def main():
         # Initialize components
         print("\nInitializing Agent System...")
         
-        # Initialize RAG chain
-        vectorstore_manager = VectorStoreManager(
-            api_key=COHERE_API_KEY,
-            persist_directory=VECTORDB_PATH,
-            collection_name=COLLECTION_NAME
-        )
-        
-        rag_chain = RAGChain(
-            vectorstore_manager=vectorstore_manager,
-            cohere_api_key=COHERE_API_KEY,
-            model=COHERE_MODEL
-        )
-        
-        # Initialize agent
-        agent = DigiaAgent(
-            cohere_api_key=COHERE_API_KEY,
-            rag_chain=rag_chain,
-            model=COHERE_MODEL
-        )
+        agent, _, _ = _build_agent()
         
         print("✓ Agent system initialized successfully")
         
@@ -3,11 +3,16 @@ Test script for RAG functionality
 Run this to test the RAG retrieval and generation pipeline
 """
 
-import sys
+import asyncio
+import atexit
 import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Dict, List, Tuple
 
-# Add src directory to path
-sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+import numpy as np
 
 from src.config import (
     COHERE_API_KEY,
@@ -17,35 +22,62 @@ from src.config import (
     TOP_K_RETRIEVAL,
     TOP_K_RERANK
 )
-from src.vectorstore import VectorStoreManager
-from src.rag_chain import RAGChain
 
+# The cohere/chromadb/langchain stack is imported in _get_or_init_rag_chain(),
+# after the environment checks, so a failed check returns without loading it
+if TYPE_CHECKING:
+    from src.rag_chain import RAGChain
+
+# Inputs that leave interactive mode
+_EXIT_TOKENS = frozenset({"quit", "exit", "q"})
+
+# Banner lines, built once
+_BAR60 = "=" * 60
+_BAR70 = "=" * 70
 
-def test_basic_retrieval(rag_chain: RAGChain):
+# Reuse answers cached by earlier runs (the semantic cache is saved here on exit).
+# Off by default so the tests exercise retrieval and generation; pass --use-cache to enable
+USE_CACHE = False
+SEMANTIC_CACHE_FILE = "./.semantic_cache.npz"
+
+
+def test_basic_retrieval(rag_chain: "RAGChain", emit: Callable[[str], None] = print):
     """Test basic semantic retrieval"""
-    print("\n" + "=" * 60)
-    print("TEST 1: Basic Semantic Retrieval")
-    print("=" * 60)
+    # Output is collected and written in one go
+    lines = []
+    
+    lines.append("\n" + _BAR60)
+    lines.append("TEST 1: Basic Semantic Retrieval")
+    lines.append(_BAR60)
     
     query = "What does Digia do?"
-    print(f"\nQuery: {query}")
+    lines.append(f"\nQuery: {query}")
     
     docs = rag_chain.retrieve_documents(query)
     
-    print(f"\nRetrieved {len(docs)} documents:")
-    for i, doc in enumerate(docs[:3], 1):
-        print(f"\n{i}. Source: {doc.metadata.get('source', 'Unknown')}")
-        print(f"   Content: {doc.page_content[:150]}...")
+    # Fields pulled out once into parallel lists, then formatted
+    shown = docs[:3]
+    sources = [doc.metadata.get('source', 'Unknown') for doc in shown]
+    contents = [doc.page_content[:150] for doc in shown]
+    
+    lines.append(f"\nRetrieved {len(docs)} documents:")
+    for i, (source, content) in enumerate(zip(sources, contents), 1):
+        lines.append(f"\n{i}. Source: {source}")
+        lines.append(f"   Content: {content}...")
+    
+    emit("\n".join(lines))
 
 
-def test_reranking(rag_chain: RAGChain):
+def test_reranking(rag_chain: "RAGChain", emit: Callable[[str], None] = print):
     """Test reranking functionality"""
-    print("\n" + "=" * 60)
-    print("TEST 2: Reranking")
-    print("=" * 60)
+    lines = []
+    
+    lines.append("\n" + _BAR60)
+    lines.append("TEST 2: Reranking")
+    lines.append(_BAR60)
     
     query = "Tell me about Digia's services"
-    print(f"\nQuery: {query}")
+    lines.append(f"\nQuery: {query}")
     
     # Retrieve documents
     docs = rag_chain.retrieve_documents(query)
@@ -53,18 +85,27 @@ def test_reranking(rag_chain: RAGChain):
     # Rerank
     reranked_docs = rag_chain.rerank_documents(query, docs)
     
-    print(f"\nTop {len(reranked_docs)} reranked documents:")
-    for i, doc in enumerate(reranked_docs, 1):
-        print(f"\n{i}. Relevance Score: {doc['relevance_score']:.3f}")
-        print(f"   Source: {doc['metadata'].get('source', 'Unknown')}")
-        print(f"   Content: {doc['content'][:150]}...")
+    # All scores formatted in one NumPy call
+    scores = np.char.mod('%.3f', np.fromiter((doc['relevance_score'] for doc in reranked_docs), dtype=np.float64))
+    sources = [doc['metadata'].get('source', 'Unknown') for doc in reranked_docs]
+    contents = [doc['content'][:150] for doc in reranked_docs]
+    
+    lines.append(f"\nTop {len(reranked_docs)} reranked documents:")
+    for i, (score, source, content) in enumerate(zip(scores, sources, contents), 1):
+        lines.append(f"\n{i}. Relevance Score: {score}")
+        lines.append(f"   Source: {source}")
+        lines.append(f"   Content: {content}...")
+    
+    emit("\n".join(lines))
 
 
-def test_full_rag_pipeline(rag_chain: RAGChain):
+def test_full_rag_pipeline(rag_chain: "RAGChain", emit: Callable[[str], None] = print):
     """Test complete RAG pipeline"""
-    print("\n" + "=" * 60)
-    print("TEST 3: Full RAG Pipeline (with Rerank)")
-    print("=" * 60)
+    lines = []
+    
+    lines.append("\n" + _BAR60)
+    lines.append("TEST 3: Full RAG Pipeline (with Rerank)")
+    lines.append(_BAR60)
     
     queries = [
         "What is Digia?",
@@ -73,78 +114,230 @@ def test_full_rag_pipeline(rag_chain: RAGChain):
         "Tell me about Digia's products"
     ]
     
-    for query in queries:
-        print(f"\n{'=' * 60}")
-        print(f"Query: {query}")
-        print('=' * 60)
-        
-        result = rag_chain.query(query, use_rerank=True)
+    # All queries run concurrently on the async client; results are printed afterwards in query order
+    results = asyncio.run(rag_chain.aquery_batch(queries, use_rerank=True))
+    
+    for query, result in zip(queries, results):
+        lines.append("\n" + _BAR60)
+        lines.append(f"Query: {query}")
+        lines.append(_BAR60)
         
         if result['error']:
-            print(f"\n❌ Error: {result['error']}")
+            lines.append(f"\n❌ Error: {result['error']}")
             continue
         
-        print(f"\n📝 Answer:")
-        print(result['answer'])
+        lines.append(f"\n📝 Answer:")
+        lines.append(result['answer'])
         
-        print(f"\n📚 Sources ({len(result['sources'])}):")
-        for i, source in enumerate(result['sources'], 1):
-            print(f"  {i}. {source['source']} (Relevance: {source['relevance_score']:.3f})")
+        lines.append(f"\n📚 Sources ({len(result['sources'])}):")
+        scores = np.char.mod('%.3f', np.fromiter((source['relevance_score'] for source in result['sources']), dtype=np.float64))
+        for i, (source, score) in enumerate(zip(result['sources'], scores), 1):
+            lines.append(f"  {i}. {source['source']} (Relevance: {score})")
+    
+    emit("\n".join(lines))
 
 
-def test_without_rerank(rag_chain: RAGChain):
+def test_without_rerank(rag_chain: "RAGChain", emit: Callable[[str], None] = print):
     """Test RAG pipeline without reranking"""
-    print("\n" + "=" * 60)
-    print("TEST 4: RAG Pipeline (without Rerank)")
-    print("=" * 60)
+    lines = []
+    
+    lines.append("\n" + _BAR60)
+    lines.append("TEST 4: RAG Pipeline (without Rerank)")
+    lines.append(_BAR60)
     
     query = "What is Digia?"
-    print(f"\nQuery: {query}")
+    lines.append(f"\nQuery: {query}")
     
     result = rag_chain.query(query, use_rerank=False)
     
-    print(f"\n📝 Answer:")
-    print(result['answer'])
+    lines.append(f"\n📝 Answer:")
+    lines.append(result['answer'])
     
-    print(f"\n📚 Sources ({len(result['sources'])}):")
+    lines.append(f"\n📚 Sources ({len(result['sources'])}):")
     for i, source in enumerate(result['sources'], 1):
-        print(f"  {i}. {source['source']}")
+        lines.append(f"  {i}. {source['source']}")
+    
+    emit("\n".join(lines))
 
 
-def interactive_mode(rag_chain: RAGChain):
+class _FailOnceClient:
+    """Cohere client whose first chat call fails; everything else goes to the real client"""
+    
+    def __init__(self, client):
+        self._client = client
+        self.failed = False
+    
+    def chat(self, **kwargs):
+        if not self.failed:
+            self.failed = True
+            raise RuntimeError("simulated Cohere outage")
+        return self._client.chat(**kwargs)
+    
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def test_failed_generation_not_cached(rag_chain: "RAGChain", emit: Callable[[str], None] = print):
+    """Test that a failed generation is reported, not cached, and retried on the next ask"""
+    lines = []
+    
+    lines.append("\n" + _BAR60)
+    lines.append("TEST 5: Failed Generation Is Not Cached")
+    lines.append(_BAR60)
+    
+    # A separate chain with empty caches, whose first chat call fails
+    failing_chain = type(rag_chain)(
+        vectorstore_manager=rag_chain.vectorstore_manager,
+        cohere_api_key=rag_chain.cohere_api_key,
+        model=rag_chain.model,
+        top_k_retrieval=rag_chain.top_k_retrieval,
+        top_k_rerank=rag_chain.top_k_rerank,
+        cohere_client=_FailOnceClient(rag_chain.cohere_client)
+    )
+    
+    query = "Where is Digia located?"
+    lines.append(f"\nQuery: {query}")
+    
+    first = failing_chain.query(query, use_rerank=False)
+    paraphrase = failing_chain.query("Where is Digia based?", use_rerank=False)
+    second = failing_chain.query(query, use_rerank=False)
+    
+    failed_reported = first['error'] is not None
+    paraphrase_answered = paraphrase['error'] is None and paraphrase['answer'] != first['answer']
+    retried = second['error'] is None and second['answer'] != first['answer']
+    lines.append(f"\n{'✅' if failed_reported else '❌'} Failed generation reported as an error: {first['error']}")
+    lines.append(f"{'✅' if paraphrase_answered else '❌'} Paraphrase answered, not served the failure from the semantic cache")
+    lines.append(f"{'✅' if retried else '❌'} Repeated question answered after recovery, not from cache")
+    
+    emit("\n".join(lines))
+
+
+def interactive_mode(rag_chain: "RAGChain"):
     """Interactive testing mode"""
-    print("\n" + "=" * 60)
+    print("\n" + _BAR60)
     print("INTERACTIVE MODE")
-    print("=" * 60)
+    print(_BAR60)
     print("Type your questions (or 'quit' to exit)")
     
     while True:
         query = input("\n\nYour question: ").strip()
         
-        if query.lower() in ['quit', 'exit', 'q']:
+        if query.lower() in _EXIT_TOKENS:
             print("Exiting interactive mode...")
             break
         
         if not query:
             continue
         
-        result = rag_chain.query(query, use_rerank=True)
+        # Print the answer as it is generated; the last item is the full result
+        result = None
+        answered = False
+        for chunk in rag_chain.query_stream(query, use_rerank=True):
+            if isinstance(chunk, dict):
+                result = chunk
+                continue
+            
+            # Header goes out with the first text, after the retrieval logs
+            if not answered:
+                print("\n" + _BAR60)
+                print("Answer:")
+                print(_BAR60)
+                answered = True
+            sys.stdout.write(chunk)
+            sys.stdout.flush()
         
-        print(f"\n{'=' * 60}")
-        print("Answer:")
-        print('=' * 60)
-        print(result['answer'])
+        # An error result carries its message only in the final dict
+        if not answered:
+            print("\n" + _BAR60)
+            print("Answer:")
+            print(_BAR60)
+            sys.stdout.write(result['answer'])
+        print()
         
         print(f"\nSources:")
         for i, source in enumerate(result['sources'], 1):
             print(f"  {i}. {source['source']} (Score: {source['relevance_score']:.3f})")
 
 
+def _run_concurrently(rag_chain: "RAGChain", tests: List[Callable]):
+    """Run independent tests side by side, printing each one's buffered output as it completes"""
+    def run(test: Callable) -> List[str]:
+        lines = []
+        test(rag_chain, emit=lines.append)
+        return lines
+    
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        for future in as_completed([pool.submit(run, test) for test in tests]):
+            print("\n".join(future.result()))
+
+
+def _warm_up(rag_chain: "RAGChain"):
+    """Embed a dummy query and touch the index, so the first test skips the cold start"""
+    try:
+        rag_chain.vectorstore_manager.warm_up()
+    except Exception:
+        # Stay quiet at the prompt; the first real query reports any connection problem
+        pass
+
+
+@lru_cache(maxsize=1)
+def _get_or_init_rag_chain(use_cache: bool = USE_CACHE) -> "RAGChain":
+    """Build the RAG chain once per process, so every test shares its clients and caches"""
+    import cohere
+    from src.vectorstore import VectorStoreManager
+    from src.rag_chain import RAGChain
+    
+    # One client, and so one keep-alive connection pool, for embed, rerank and chat
+    cohere_client = cohere.Client(COHERE_API_KEY)
+    
+    vectorstore_manager = VectorStoreManager(
+        api_key=COHERE_API_KEY,
+        persist_directory=VECTORDB_PATH,
+        collection_name=COLLECTION_NAME,
+        cohere_client=cohere_client,
+        mmap_search=True
+    )
+    
+    rag_chain = RAGChain(
+        vectorstore_manager=vectorstore_manager,
+        cohere_api_key=COHERE_API_KEY,
+        model=COHERE_MODEL,
+        top_k_retrieval=TOP_K_RETRIEVAL,
+        top_k_rerank=TOP_K_RERANK,
+        cohere_client=cohere_client
+    )
+    
+    if use_cache:
+        loaded = rag_chain.load_semantic_cache(SEMANTIC_CACHE_FILE)
+        if loaded:
+            print(f"✓ Loaded {loaded} cached answers from {SEMANTIC_CACHE_FILE}")
+        atexit.register(rag_chain.save_semantic_cache, SEMANTIC_CACHE_FILE)
+    
+    return rag_chain
+
+
+def _run_all_tests(rag_chain):
+    """Run every automated test"""
+    # These are independent, so their API calls overlap
+    _run_concurrently(rag_chain, [test_basic_retrieval, test_reranking, test_without_rerank, test_failed_generation_not_cached])
+    test_full_rag_pipeline(rag_chain)
+
+
+# Menu choice -> tests to run, in order
+_DISPATCH: Dict[str, Tuple[Callable, ...]] = {
+    '1': (_run_all_tests,),
+    '2': (test_basic_retrieval,),
+    '3': (test_reranking,),
+    '4': (test_full_rag_pipeline,),
+    '5': (interactive_mode,),
+}
+
+
 def main():
     """Main test function"""
-    print("\n" + "=" * 70)
+    print("\n" + _BAR70)
     print("RAG SYSTEM TEST SUITE")
-    print("=" * 70)
+    print(_BAR70)
     
     # Check API key
     if not COHERE_API_KEY:
@@ -161,56 +354,35 @@ def main():
         # Initialize RAG chain
         print("\nInitializing RAG Chain...")
         
-        vectorstore_manager = VectorStoreManager(
-            api_key=COHERE_API_KEY,
-            persist_directory=VECTORDB_PATH,
-            collection_name=COLLECTION_NAME
-        )
-        
-        rag_chain = RAGChain(
-            vectorstore_manager=vectorstore_manager,
-            cohere_api_key=COHERE_API_KEY,
-            model=COHERE_MODEL,
-            top_k_retrieval=TOP_K_RETRIEVAL,
-            top_k_rerank=TOP_K_RERANK
-        )
+        rag_chain = _get_or_init_rag_chain(USE_CACHE or "--use-cache" in sys.argv[1:])
         
         print("✓ RAG Chain initialized successfully")
         
         # Run tests
-        print("\n" + "=" * 70)
+        print("\n" + _BAR70)
         print("Select test mode:")
         print("  1. Run all automated tests")
         print("  2. Test basic retrieval only")
         print("  3. Test reranking only")
         print("  4. Test full RAG pipeline")
         print("  5. Interactive mode")
-        print("=" * 70)
+        print(_BAR70)
+        
+        # Use the time spent waiting at the prompt to open the connection and page in the index
+        threading.Thread(target=_warm_up, args=(rag_chain,), daemon=True).start()
         
         choice = input("\nEnter your choice (1-5): ").strip()
         
-        if choice == '1':
-            test_basic_retrieval(rag_chain)
-            test_reranking(rag_chain)
-            test_full_rag_pipeline(rag_chain)
-            test_without_rerank(rag_chain)
-        elif choice == '2':
-            test_basic_retrieval(rag_chain)
-        elif choice == '3':
-            test_reranking(rag_chain)
-        elif choice == '4':
-            test_full_rag_pipeline(rag_chain)
-        elif choice == '5':
-            interactive_mode(rag_chain)
-        else:
+        tests = _DISPATCH.get(choice)
+        if tests is None:
             print("Invalid choice. Running all tests...")
-            test_basic_retrieval(rag_chain)
-            test_reranking(rag_chain)
-            test_full_rag_pipeline(rag_chain)
+            tests = _DISPATCH['1']
+        for test in tests:
+            test(rag_chain)
         
-        print("\n" + "=" * 70)
+        print("\n" + _BAR70)
         print("✅ Testing Complete!")
-        print("=" * 70 + "\n")
+        print(_BAR70 + "\n")
         
     except Exception as e:
         print(f"\n❌ Error: {e}")